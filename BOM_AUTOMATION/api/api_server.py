@@ -160,7 +160,7 @@ def upload_pdf():
         try:
             # Get all symbols
             template_mgr = SymbolTemplate()
-            symbols = template_mgr.list_symbols()
+            symbols = template_mgr.get_all_symbols()
             
             if not symbols:
                 return jsonify({
@@ -170,10 +170,9 @@ def upload_pdf():
             
             # Load templates
             templates_dict = {}
-            for sym in symbols:
-                img = template_mgr.get_symbol(sym['symbol_name'])
+            for symbol_name, img in symbols.items():
                 if img is not None:
-                    templates_dict[sym['symbol_name']] = img
+                    templates_dict[symbol_name] = img
             
             template_mgr.close()
             
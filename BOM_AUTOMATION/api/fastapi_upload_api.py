@@ -678,7 +678,7 @@ async def detect(file: UploadFile = File(...)):
 
             # Get all symbols from DB
             template_mgr = SymbolTemplate()
-            symbols = template_mgr.list_symbols()
+            symbols = template_mgr.get_all_symbols()
             if not symbols:
                 template_mgr.close()
                 raise HTTPException(
@@ -689,11 +689,10 @@ async def detect(file: UploadFile = File(...)):
             print(f"[*] Found {len(symbols)} symbol templates in DB")
             # Load templates
             templates_dict = {}
-            for sym in symbols:
-                img = template_mgr.get_symbol(sym['symbol_name'])
+            for symbol_name, img in symbols.items():
                 if img is not None:
-                    templates_dict[sym['symbol_name']] = img
-                    print(f"  [OK] Loaded: {sym['symbol_name']}")
+                    templates_dict[symbol_name] = img
+                    print(f"  [OK] Loaded: {symbol_name}")
             template_mgr.close()
 
             # Run detection
@@ -112,7 +112,7 @@ def detect_symbols():
         
         # Get all symbols from MongoDB
         template_mgr = SymbolTemplate()
-        symbols = template_mgr.list_symbols()
+        symbols = template_mgr.get_all_symbols()
         
         if not symbols:
             template_mgr.close()
@@ -125,11 +125,10 @@ def detect_symbols():
         
         # Load templates
         templates_dict = {}
-        for sym in symbols:
-            img = template_mgr.get_symbol(sym['symbol_name'])
+        for symbol_name, img in symbols.items():
             if img is not None:
-                templates_dict[sym['symbol_name']] = img
-                print(f"  [OK] Loaded: {sym['symbol_name']}")
+                templates_dict[symbol_name] = img
+                print(f"  [OK] Loaded: {symbol_name}")
         
         template_mgr.close()
         
@@ -662,7 +662,7 @@ def detect():
         
         # Get all symbols
         template_mgr = SymbolTemplate()
-        symbols = template_mgr.list_symbols()
+        symbols = template_mgr.get_all_symbols()
         
         if not symbols:
             template_mgr.close()
@@ -674,11 +674,10 @@ def detect():
         
         # Load templates
         templates_dict = {}
-        for sym in symbols:
-            img = template_mgr.get_symbol(sym['symbol_name'])
+        for symbol_name, img in symbols.items():
             if img is not None:
-                templates_dict[sym['symbol_name']] = img
-                print(f"  [OK] Loaded: {sym['symbol_name']}")
+                templates_dict[symbol_name] = img
+                print(f"  [OK] Loaded: {symbol_name}")
         
         template_mgr.close()
         
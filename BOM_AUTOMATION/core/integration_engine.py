@@ -55,13 +55,15 @@ class IntegrationEngine:
             'confidence_report': {}
         }
     
-    def process_page(self, page_num: int, symbol_templates: Dict) -> Dict:
+    def process_page(self, page_num: int, symbol_templates: Dict,
+                     preprocessed: Optional[Dict] = None) -> Dict:
         """
         Process a single page through the complete pipeline
         
         Args:
             page_num: Page number (0-indexed)
             symbol_templates: Dict mapping symbol names to template images
+            preprocessed: The page's PreprocessingPipeline result, if already computed
             
         Returns:
             Processed page data
@@ -79,7 +81,8 @@ class IntegrationEngine:
         
         # Step 1: Preprocessing
         print("  [1/6] Preprocessing...")
-        preprocessed = self.preprocessor.process_page(page_num)
+        if preprocessed is None:
+            preprocessed = self.preprocessor.process_page(page_num)
         
         # Step 2: Symbol Detection (3-layer approach)
         print("  [2/6] Symbol detection...")
@@ -121,24 +124,26 @@ class IntegrationEngine:
         if preprocessed.get('raster_data') is not None:
             image = preprocessed['raster_data']
         elif preprocessed.get('is_vector'):
-            # Convert vector page to image
+            # Convert vector page to image. Template and feature matching only
+            # need grayscale, so render gray directly unless an ML model needs color.
             import pymupdf as fitz
             doc = fitz.open(self.pdf_path)
             page = doc[page_num]
-            pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72))
+            colorspace = fitz.csRGB if self.ml_detector else fitz.csGRAY
+            pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72),
+                                  colorspace=colorspace, alpha=False)
             import numpy as np
-            image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(
-                pix.height, pix.width, pix.n
-            )
+            shape = (pix.height, pix.width) if pix.n == 1 else (pix.height, pix.width, pix.n)
+            image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(shape)
             doc.close()
         
         if image is None:
             return detections
         
-        # Convert to grayscale if needed
+        # Convert to grayscale if needed (PyMuPDF pixmaps are RGB)
         import cv2
         if len(image.shape) == 3:
-            image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            image_gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
         else:
             image_gray = image
         
@@ -301,8 +306,10 @@ class IntegrationEngine:
         
         print(f"\nProcessing {total_pages} page(s)...")
         
-        for page_num in range(total_pages):
-            page_result = self.process_page(page_num, symbol_templates)
+        # Scanned pages are preprocessed on worker threads while earlier
+        # pages go through detection and parsing
+        for preprocessed in self.preprocessor.iter_pages(range(total_pages)):
+            page_result = self.process_page(preprocessed['page'], symbol_templates, preprocessed)
             self.results['pages'].append(page_result)
         
         # Aggregate results
@@ -0,0 +1,59 @@
+"""
+Page-block process pool shared by the PDF extractors
+
+A worker opens its own copy of the PDF and handles a contiguous block of
+pages, so process startup and document parsing are paid once per block.
+On small drawings that overhead is more than the parsing it saves, so
+the default is to stay in-process unless every worker gets enough pages.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+
+# Default pool size cap and the fewest pages per worker that justify a pool
+MAX_WORKERS = 8
+MIN_PAGES_PER_WORKER = 16
+# Blocks per worker, so a slow block does not leave the other workers idle
+BLOCKS_PER_WORKER = 4
+
+
+def pool_workers(page_count, workers=None):
+    """
+    Worker processes to use for page_count pages
+    
+    An explicit workers count is only capped at the page count. With
+    workers=None, pages are handled in-process (1) unless each of up to
+    min(cpu_count, MAX_WORKERS) workers gets MIN_PAGES_PER_WORKER pages.
+    """
+    if workers is None:
+        workers = min(os.cpu_count() or 1, MAX_WORKERS, page_count // MIN_PAGES_PER_WORKER)
+    return max(1, min(workers, page_count))
+
+
+def page_blocks(page_nums, workers, block_size=None):
+    """Split page_nums into contiguous blocks, about BLOCKS_PER_WORKER per worker"""
+    block_size = block_size or max(1, len(page_nums) // (BLOCKS_PER_WORKER * workers))
+    return [page_nums[i:i + block_size] for i in range(0, len(page_nums), block_size)]
+
+
+def map_page_blocks(func, pdf_path, page_nums, workers, *args, block_size=None):
+    """
+    Yield the items of func(pdf_path, block, *args) for every page block,
+    in page order
+    
+    func must be a picklable module-level function returning a list. With
+    workers <= 1 it is called once, in-process, on all of page_nums.
+    """
+    page_nums = list(page_nums)
+    if workers <= 1:
+        yield from func(pdf_path, page_nums, *args)
+        return
+    
+    blocks = page_blocks(page_nums, workers, block_size)
+    extra = [repeat(arg) for arg in args]
+    with ProcessPoolExecutor(max_workers=min(workers, len(blocks))) as executor:
+        # map() keeps the blocks, and so the pages, in order
+        yield from chain.from_iterable(
+            executor.map(func, repeat(pdf_path), blocks, *extra)
+        )
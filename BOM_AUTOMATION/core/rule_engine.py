@@ -7,6 +7,68 @@ Ensures data correctness through validation and normalization rules
 import re
 from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+    HAS_SCIPY = True
+except ImportError:
+    cKDTree = None
+    HAS_SCIPY = False
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    njit = prange = None
+    HAS_NUMBA = False
+
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    ahocorasick = None
+    HAS_AHOCORASICK = False
+
+
+def _centers(items: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Collect bbox centers of items into a (K, 2) array.
+    Items without a usable bbox are skipped; their original indices are
+    returned alongside so results can be mapped back.
+    """
+    indices = []
+    coords = []
+    for i, item in enumerate(items):
+        bbox = item.get('bbox', [])
+        if not bbox or len(bbox) < 4:
+            continue
+        x0, y0, x1, y1 = bbox[:4]
+        indices.append(i)
+        coords.append(((x0 + x1) * 0.5, (y0 + y1) * 0.5))
+    
+    return (np.asarray(indices, dtype=np.int64),
+            np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+
+
+if HAS_NUMBA:
+    # No fastmath: best starts at +inf, which the ninf flag would let LLVM
+    # assume away (the reduction gains nothing from it anyway)
+    @njit(parallel=True, cache=True)
+    def _nearest_numba(symbol_xy, text_xy, max_dist_sq):
+        """Nearest text per symbol within max distance (squared); index -1 when none"""
+        n = symbol_xy.shape[0]
+        nearest = np.full(n, -1, np.int64)
+        best = np.full(n, np.inf)
+        for i in prange(n):
+            for j in range(text_xy.shape[0]):
+                dx = symbol_xy[i, 0] - text_xy[j, 0]
+                dy = symbol_xy[i, 1] - text_xy[j, 1]
+                d = dx * dx + dy * dy
+                if d < best[i] and d <= max_dist_sq:
+                    best[i] = d
+                    nearest[i] = j
+        return nearest, best
 
 
 class RuleEngine:
@@ -22,8 +84,44 @@ class RuleEngine:
     def __init__(self):
         self.material_mappings = self._load_material_mappings()
         self.unit_patterns = self._load_unit_patterns()
+        
+        # Precompiled patterns: each unit's alternatives fused into a single
+        # regex so one scan per unit replaces one scan per alternative.
+        # Units are still tried in priority order (mm before cm before m ...).
+        self._unit_res = [
+            (unit, re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE))
+            for unit, patterns in self.unit_patterns.items()
+        ]
+        self._qty_res = [
+            re.compile(p, re.IGNORECASE) for p in (
+                r'QTY[:\s]+(\d+)',
+                r'QUANTITY[:\s]+(\d+)',
+                r'QTY\.?\s*[=:]?\s*(\d+)',
+                r'(\d+)\s*(?:pcs|pieces|units)',
+            )
+        ]
+        self._metric_re = re.compile(r'M(\d+(?:\.\d+)?)', re.IGNORECASE)
+        self._dia_re = re.compile(r'[ØØ](\d+(?:\.\d+)?)', re.IGNORECASE)
+        self._rect_re = re.compile(r'(\d+(?:\.\d+)?)\s*[xX×]\s*(\d+(?:\.\d+)?)')
+        self._num_re = re.compile(r'(\d+(?:\.\d+)?)')
+        # One pass over material prefixes; the matching group names the family
+        self._mat_re = re.compile(r'SS(?P<ss>\d+)|AL(?P<al>\d+)')
+        
+        # Multi-pattern scanner for known material codes inside free text
+        # ("PLATE SS304 3MM"): one linear pass regardless of mapping size
+        if HAS_AHOCORASICK:
+            self._mat_ac = ahocorasick.Automaton()
+            for key in self.material_mappings:
+                self._mat_ac.add_word(key.upper(), key)
+            self._mat_ac.make_automaton()
+        else:
+            self._mat_ac = None
+            keys = sorted(self.material_mappings, key=len, reverse=True)
+            self._mat_token_re = re.compile(
+                r'(?<![A-Z0-9])(?:' + '|'.join(map(re.escape, keys)) + r')(?![A-Z0-9])'
+            )
     
-    def link_symbols_to_text(self, symbols: List[Dict], texts: List[Dict], 
+    def link_symbols_to_text(self, symbols: List[Dict], texts: List[Dict],
                             max_distance: float = 500.0) -> List[Dict]:
         """
         Link symbols to matching OCR text via nearest-neighbor
@@ -36,38 +134,54 @@ class RuleEngine:
         Returns:
             List of relations {symbol_index, text_index, distance, score}
         """
-        relations = []
+        symbol_idx, symbol_xy = _centers(symbols)
+        text_idx, text_xy = _centers(texts)
+        if len(symbol_idx) == 0 or len(text_idx) == 0:
+            return []
         
-        for i, symbol in enumerate(symbols):
-            symbol_center = self._get_bbox_center(symbol.get('bbox', []))
-            if symbol_center is None:
-                continue
-            
-            best_match = None
-            best_distance = float('inf')
-            
-            for j, text in enumerate(texts):
-                text_center = self._get_bbox_center(text.get('bbox', []))
-                if text_center is None:
-                    continue
-                
-                distance = self._euclidean_distance(symbol_center, text_center)
-                
-                if distance < best_distance and distance <= max_distance:
-                    best_distance = distance
-                    best_match = j
-            
-            if best_match is not None:
-                # Score based on distance (closer = higher score)
-                score = max(0.0, 1.0 - (best_distance / max_distance))
-                relations.append({
-                    'symbol_index': i,
-                    'text_index': best_match,
-                    'distance': best_distance,
-                    'score': score
-                })
+        # Thresholds are compared on squared distances; sqrt is taken only
+        # for the winning pair of each linked symbol
+        max_dist_sq = max_distance * max_distance
+        
+        if HAS_SCIPY:
+            # KD-tree query: O((N + M) log M) instead of the N x M pair scan.
+            # distance_upper_bound is exclusive, nudge it so max_distance itself links.
+            tree_dist, nearest = cKDTree(text_xy).query(
+                symbol_xy, k=1,
+                distance_upper_bound=np.nextafter(max_distance, np.inf)
+            )
+            valid = np.isfinite(tree_dist)
+            distances = tree_dist[valid]
+        elif HAS_NUMBA:
+            # Compiled pair scan: no N x M temporaries, parallel over symbols
+            nearest, best_sq = _nearest_numba(symbol_xy, text_xy, max_dist_sq)
+            valid = nearest >= 0
+            distances = np.sqrt(best_sq[valid])
+        else:
+            # Broadcast fallback: all pair distances in one NumPy pass
+            diff = symbol_xy[:, None, :] - text_xy[None, :, :]
+            dist_sq = np.einsum('ijk,ijk->ij', diff, diff)
+            nearest = dist_sq.argmin(axis=1)
+            best_sq = dist_sq[np.arange(len(nearest)), nearest]
+            valid = best_sq <= max_dist_sq
+            distances = np.sqrt(best_sq[valid])
         
-        return relations
+        # Score based on distance (closer = higher score)
+        scores = np.maximum(0.0, 1.0 - distances / max_distance)
+        
+        # Output size is known here; build the list in one comprehension
+        return [
+            {
+                'symbol_index': i,
+                'text_index': j,
+                'distance': distance,
+                'score': score
+            }
+            for i, j, distance, score in zip(symbol_idx[valid].tolist(),
+                                             text_idx[nearest[valid]].tolist(),
+                                             distances.tolist(),
+                                             scores.tolist())
+        ]
     
     def normalize_material(self, material_text: str) -> Dict[str, str]:
         """
@@ -85,6 +199,11 @@ class RuleEngine:
         if material_text in self.material_mappings:
             return self.material_mappings[material_text]
         
+        # Known material code embedded in a longer description
+        key = self._find_material_token(material_text)
+        if key is not None:
+            return self.material_mappings[key]
+        
         # Pattern-based matching
         normalized = self._normalize_by_pattern(material_text)
         if normalized:
@@ -110,29 +229,26 @@ class RuleEngine:
             Dict with value, unit, and confidence
         """
         # Check for explicit units in text
-        for unit, patterns in self.unit_patterns.items():
-            for pattern in patterns:
-                match = re.search(pattern, value_text, re.IGNORECASE)
-                if match:
+        for unit, unit_re in self._unit_res:
+            if unit_re.search(value_text):
+                return {
+                    'value': value_text,
+                    'unit': unit,
+                    'confidence': 1.0,
+                    'method': 'explicit'
+                }
+        
+        # Infer from context
+        if context:
+            for unit, unit_re in self._unit_res:
+                if unit_re.search(context):
                     return {
                         'value': value_text,
                         'unit': unit,
-                        'confidence': 1.0,
-                        'method': 'explicit'
+                        'confidence': 0.7,
+                        'method': 'context'
                     }
         
-        # Infer from context
-        if context:
-            for unit, patterns in self.unit_patterns.items():
-                for pattern in patterns:
-                    if re.search(pattern, context, re.IGNORECASE):
-                        return {
-                            'value': value_text,
-                            'unit': unit,
-                            'confidence': 0.7,
-                            'method': 'context'
-                        }
-        
         # Default inference (common in CAD: mm)
         return {
             'value': value_text,
@@ -152,7 +268,7 @@ class RuleEngine:
             Dict with parsed dimension data
         """
         # Pattern: M8, M10, etc. (metric threads)
-        metric_thread = re.match(r'M(\d+(?:\.\d+)?)', dimension_text, re.IGNORECASE)
+        metric_thread = self._metric_re.match(dimension_text)
         if metric_thread:
             return {
                 'type': 'metric_thread',
@@ -162,7 +278,7 @@ class RuleEngine:
             }
         
         # Pattern: Ø12.5 (diameter)
-        diameter = re.match(r'[ØØ](\d+(?:\.\d+)?)', dimension_text, re.IGNORECASE)
+        diameter = self._dia_re.match(dimension_text)
         if diameter:
             return {
                 'type': 'diameter',
@@ -172,7 +288,7 @@ class RuleEngine:
             }
         
         # Pattern: 100x50 (rectangular)
-        rectangular = re.match(r'(\d+(?:\.\d+)?)\s*[xX×]\s*(\d+(?:\.\d+)?)', dimension_text)
+        rectangular = self._rect_re.match(dimension_text)
         if rectangular:
             return {
                 'type': 'rectangular',
@@ -183,7 +299,7 @@ class RuleEngine:
             }
         
         # Pattern: Simple number
-        number = re.match(r'(\d+(?:\.\d+)?)', dimension_text)
+        number = self._num_re.match(dimension_text)
         if number:
             return {
                 'type': 'numeric',
@@ -200,31 +316,13 @@ class RuleEngine:
     
     def extract_quantity(self, text: str) -> Optional[int]:
         """Extract quantity from text (QTY: 4, Quantity: 4, etc.)"""
-        patterns = [
-            r'QTY[:\s]+(\d+)',
-            r'QUANTITY[:\s]+(\d+)',
-            r'QTY\.?\s*[=:]?\s*(\d+)',
-            r'(\d+)\s*(?:pcs|pieces|units)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for qty_re in self._qty_res:
+            match = qty_re.search(text)
             if match:
                 return int(match.group(1))
         
         return None
     
-    def _get_bbox_center(self, bbox: List) -> Optional[Tuple[float, float]]:
-        """Get center point of bounding box"""
-        if not bbox or len(bbox) < 4:
-            return None
-        x0, y0, x1, y1 = bbox[:4]
-        return ((x0 + x1) / 2.0, (y0 + y1) / 2.0)
-    
-    def _euclidean_distance(self, p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
-        """Calculate Euclidean distance between two points"""
-        return ((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2) ** 0.5
-    
     def _load_material_mappings(self) -> Dict[str, Dict]:
         """Load material normalization mappings"""
         return {
@@ -270,12 +368,37 @@ class RuleEngine:
             'ft': [r'\d+\s*ft', r'\d+\.\d+\s*ft', r'\d+\'', r'FOOT']
         }
     
+    def _find_material_token(self, material_text: str) -> Optional[str]:
+        """
+        Leftmost known material code appearing as a whole token in the text;
+        the longest one when several start there, like the regex fallback
+        """
+        if self._mat_ac is None:
+            match = self._mat_token_re.search(material_text)
+            return match.group(0) if match else None
+        
+        best = None
+        for end, key in self._mat_ac.iter(material_text):
+            start = end - len(key) + 1
+            # Whole tokens only: "MS" must not match inside "ALUMS"
+            if start > 0 and material_text[start - 1].isalnum():
+                continue
+            if end + 1 < len(material_text) and material_text[end + 1].isalnum():
+                continue
+            if best is None or start < best[0] or (start == best[0] and len(key) > len(best[1])):
+                best = (start, key)
+        return best[1] if best else None
+    
     def _normalize_by_pattern(self, material_text: str) -> Optional[Dict]:
         """Normalize material by pattern matching"""
+        match = self._mat_re.match(material_text)
+        if not match:
+            return None
+        
+        grade = match.group(match.lastgroup)
+        
         # Pattern: SS followed by numbers
-        ss_match = re.match(r'SS(\d+)', material_text)
-        if ss_match:
-            grade = ss_match.group(1)
+        if match.lastgroup == 'ss':
             return {
                 'original': material_text,
                 'normalized': f'Stainless Steel {grade}',
@@ -284,17 +407,12 @@ class RuleEngine:
             }
         
         # Pattern: AL followed by numbers
-        al_match = re.match(r'AL(\d+)', material_text)
-        if al_match:
-            grade = al_match.group(1)
-            return {
-                'original': material_text,
-                'normalized': f'Aluminum {grade}',
-                'category': 'aluminum',
-                'standard': f'AA {grade}'
-            }
-        
-        return None
+        return {
+            'original': material_text,
+            'normalized': f'Aluminum {grade}',
+            'category': 'aluminum',
+            'standard': f'AA {grade}'
+        }
 
 
 if __name__ == "__main__":
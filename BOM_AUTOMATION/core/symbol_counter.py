@@ -29,6 +29,104 @@ except ImportError:
 import re
 from collections import Counter, defaultdict
 
+import numpy as np
+
+
+# Symbol categories, compiled once at import
+SYMBOL_CATEGORIES = {
+    'alphanumeric': r'[a-zA-Z0-9]',
+    'spaces_newlines': r'[\s\n\r\t]',
+    'punctuation': r'[.,;:\'"!?()[\]{}]',
+    'mathematical': r'[+\-*/=<>±×÷∑∏∫√∞]',
+    'special_chars': r'[@#$%&*^~`|\\]',
+    'brackets': r'[(){}\[\]]',
+    'quotes': r'["\'\`]',
+    'dashes_hyphens': r'[-–—−]',
+    'arrows_symbols': r'[→←↑↓↖↗↙↘⟹⟸]',
+    'other': r'[^\w\s.,;:\'"!?()[\]{}@#$%&*^~`|\\+\-*/=<>±×÷∑∏∫√∞→←↑↓↖↗↙↘⟹⟸\n\r\t-]'
+}
+
+CATEGORY_PATTERNS = {name: re.compile(p) for name, p in SYMBOL_CATEGORIES.items()}
+
+# Single characters reported individually
+SPECIFIC_SYMBOLS = {
+    'Spaces': ' ',
+    'Newlines': '\n',
+    'Tabs': '\t',
+    'Periods': '.',
+    'Commas': ',',
+    'Colons': ':',
+    'Semicolons': ';',
+    'Hyphens': '-',
+    'Underscores': '_',
+    'Parentheses (': '(',
+    'Parentheses )': ')',
+    'Square Brackets [': '[',
+    'Square Brackets ]': ']',
+    'Curly Braces {': '{',
+    'Curly Braces }': '}',
+    'Quotes "': '"',
+    'Apostrophes': "'",
+    'Slashes /': '/',
+    'Backslashes': '\\',
+    'At Signs': '@',
+    'Hash/Pound': '#',
+    'Dollar Signs': '$',
+    'Percent': '%',
+    'Ampersands': '&',
+    'Asterisks': '*',
+    'Plus Signs': '+',
+    'Equals': '=',
+    'Question Marks': '?',
+    'Exclamation': '!',
+    'Pipe |': '|',
+}
+
+
+# ASCII lookup table: row = code point, column = category (1 if it matches).
+# Categories overlap (e.g. '(' is punctuation and a bracket), so this is a
+# membership matrix rather than a single category id per character.
+ASCII_CATEGORY_LUT = np.array(
+    [[1 if pattern.match(chr(code)) else 0 for pattern in CATEGORY_PATTERNS.values()]
+     for code in range(128)],
+    dtype=np.int64
+)
+
+
+def count_chars(text):
+    """Counter(text) computed in one NumPy pass over the code points."""
+    if not text:
+        return Counter()
+    
+    codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    counts = np.bincount(codes)
+    # Keep Counter's first-occurrence order (most_common breaks ties by it);
+    # first index of each code point, also in one pass
+    first = np.full(len(counts), len(codes), dtype=np.int64)
+    np.minimum.at(first, codes, np.arange(len(codes)))
+    present = np.flatnonzero(counts)
+    present = present[np.argsort(first[present])]
+    return Counter(dict(zip(map(chr, present.tolist()), counts[present].tolist())))
+
+
+def count_categories(char_counter):
+    """Per-category character counts from a Counter of characters."""
+    ascii_counts = np.zeros(128, dtype=np.int64)
+    counts = np.zeros(len(CATEGORY_PATTERNS), dtype=np.int64)
+    
+    for ch, cnt in char_counter.items():
+        code = ord(ch)
+        if code < 128:
+            ascii_counts[code] = cnt
+        else:
+            # Non-ASCII: fall back to the patterns
+            for k, pattern in enumerate(CATEGORY_PATTERNS.values()):
+                if pattern.match(ch):
+                    counts[k] += cnt
+    
+    counts += ascii_counts @ ASCII_CATEGORY_LUT
+    return dict(zip(CATEGORY_PATTERNS, counts.tolist()))
+
 
 def count_symbols_text_pdf(pdf_path):
     """Extract and count symbols from text-based PDF."""
@@ -41,18 +139,19 @@ def count_symbols_text_pdf(pdf_path):
             total_pages = len(pdf.pages)
             print(f"Total pages: {total_pages}")
             
-            all_text = ""
+            text_parts = []
             page_details = []
             
             for page_num, page in enumerate(pdf.pages, 1):
                 text = page.extract_text() or ""
-                all_text += text
+                text_parts.append(text)
                 page_details.append({
                     'page': page_num,
                     'text': text,
                     'char_count': len(text)
                 })
             
+            all_text = "".join(text_parts)
             return analyze_symbols(all_text, page_details)
     
     except Exception as e:
@@ -73,26 +172,10 @@ def analyze_symbols(text, page_details=None):
     }
     
     # Count all characters
-    char_counter = Counter(text)
-    
-    # Categorize symbols
-    symbol_categories = {
-        'alphanumeric': r'[a-zA-Z0-9]',
-        'spaces_newlines': r'[\s\n\r\t]',
-        'punctuation': r'[.,;:\'"!?()[\]{}]',
-        'mathematical': r'[+\-*/=<>±×÷∑∏∫√∞]',
-        'special_chars': r'[@#$%&*^~`|\\]',
-        'brackets': r'[(){}\[\]]',
-        'quotes': r'["\'\`]',
-        'dashes_hyphens': r'[-–—−]',
-        'arrows_symbols': r'[→←↑↓↖↗↙↘⟹⟸]',
-        'other': r'[^\w\s.,;:\'"!?()[\]{}@#$%&*^~`|\\+\-*/=<>±×÷∑∏∫√∞→←↑↓↖↗↙↘⟹⟸\n\r\t-]'
-    }
+    char_counter = count_chars(text)
     
-    # Count by category
-    for category, pattern in symbol_categories.items():
-        matches = re.findall(pattern, text)
-        count = len(matches)
+    # Count by category over unique characters rather than the full text
+    for category, count in count_categories(char_counter).items():
         if count > 0:
             results['symbols'][category] = {
                 'count': count,
@@ -129,41 +212,8 @@ def analyze_symbols(text, page_details=None):
     print("SPECIFIC SYMBOL COUNTS")
     print(f"{'='*60}")
     
-    specific_symbols = {
-        'Spaces': ' ',
-        'Newlines': '\n',
-        'Tabs': '\t',
-        'Periods': '.',
-        'Commas': ',',
-        'Colons': ':',
-        'Semicolons': ';',
-        'Hyphens': '-',
-        'Underscores': '_',
-        'Parentheses (': '(',
-        'Parentheses )': ')',
-        'Square Brackets [': '[',
-        'Square Brackets ]': ']',
-        'Curly Braces {': '{',
-        'Curly Braces }': '}',
-        'Quotes "': '"',
-        'Apostrophes': "'",
-        'Slashes /': '/',
-        'Backslashes': '\\',
-        'At Signs': '@',
-        'Hash/Pound': '#',
-        'Dollar Signs': '$',
-        'Percent': '%',
-        'Ampersands': '&',
-        'Asterisks': '*',
-        'Plus Signs': '+',
-        'Equals': '=',
-        'Question Marks': '?',
-        'Exclamation': '!',
-        'Pipe |': '|',
-    }
-    
-    for label, symbol in specific_symbols.items():
-        count = text.count(symbol)
+    for label, symbol in SPECIFIC_SYMBOLS.items():
+        count = char_counter.get(symbol, 0)
         if count > 0:
             print(f"{label:<25} {count:>10,}")
     
@@ -8,8 +8,10 @@ Detect and count symbols in uploaded PDFs
 import os
 import sys
 import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # Import dependencies with auto-install
@@ -39,6 +41,8 @@ def ensure_imports():
         return fitz, MongoClient, Image, np
 
 fitz, MongoClient, Image, np = ensure_imports()
+from bson import ObjectId
+from pymongo import ReturnDocument
 
 # Try to import cv2, use Pillow as fallback
 try:
@@ -49,12 +53,80 @@ except:
     cv2 = None
     HAS_CV2 = False
 
+# Optional: compiled match collection for large detection sets
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    njit = prange = None
+    HAS_NUMBA = False
+
+# Optional: faster JSON export
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
 load_dotenv()
 
 
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _collect_boxes(res, thresh, w, h):
+        """Boxes (x1, y1, x2, y2) and scores of every res >= thresh, in row-major order"""
+        rows, cols = res.shape
+        # Pass 1: hits per row; pass 2: each row fills its own slice
+        offsets = np.zeros(rows + 1, np.int64)
+        for y in prange(rows):
+            c = 0
+            for x in range(cols):
+                if res[y, x] >= thresh:
+                    c += 1
+            offsets[y + 1] = c
+        offsets = np.cumsum(offsets)
+        n = offsets[rows]
+        boxes = np.empty((n, 4), np.int32)
+        scores = np.empty(n, np.float32)
+        for y in prange(rows):
+            k = offsets[y]
+            for x in range(cols):
+                if res[y, x] >= thresh:
+                    boxes[k, 0] = x
+                    boxes[k, 1] = y
+                    boxes[k, 2] = x + w
+                    boxes[k, 3] = y + h
+                    scores[k] = res[y, x]
+                    k += 1
+        return boxes, scores
+
+
+def _json_default(obj):
+    """JSON fallback for the NumPy scalars and datetimes in detection results"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def write_json(obj, path):
+    """Write compact (unindented) JSON, using orjson when available"""
+    if HAS_ORJSON:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(path, 'w') as f:
+            json.dump(obj, f, default=_json_default)
+
+
 class SymbolTemplate:
     """Manage symbol templates"""
     
+    # (db, collection) pairs whose indexes this process has already ensured
+    _indexed_collections = set()
+    
     def __init__(self, db_name="utkarshproduction", collection_name="SYMBOL_TEMPLATES"):
         mongo_uri = os.getenv("MONGO_URI")
         if not mongo_uri:
@@ -64,6 +136,18 @@ class SymbolTemplate:
         self.db = self.client[db_name]
         self.collection = self.db[collection_name]
         self.client.admin.command('ping')
+        self.create_indexes()
+    
+    def create_indexes(self):
+        """Unique index on symbol_name (lookups and upserts by name), once per collection per process"""
+        key = (self.db.name, self.collection.name)
+        if key in SymbolTemplate._indexed_collections:
+            return
+        try:
+            self.collection.create_index([("symbol_name", 1)], unique=True)
+            SymbolTemplate._indexed_collections.add(key)
+        except Exception as e:
+            print(f"[WARN] Index creation: {e}")
     
     def upload_symbol(self, symbol_name, image_path, metadata=None):
         """Upload symbol template image to MongoDB"""
@@ -77,29 +161,32 @@ class SymbolTemplate:
                 image_data = f.read()
             
             # Create document
+            now = datetime.now(timezone.utc)
             doc = {
                 'symbol_name': symbol_name,
                 'image_data': image_data,
                 'image_filename': Path(image_path).name,
                 'file_size': len(image_data),
                 'metadata': metadata or {},
-                'created_at': datetime.utcnow(),
-                'updated_at': datetime.utcnow()
+                'updated_at': now
             }
             
-            # Check if exists and update or insert
-            existing = self.collection.find_one({'symbol_name': symbol_name})
+            # Update or insert in one round-trip; the pre-update document
+            # tells which one happened
+            new_id = ObjectId()
+            existing = self.collection.find_one_and_update(
+                {'symbol_name': symbol_name},
+                {'$set': doc, '$setOnInsert': {'_id': new_id, 'created_at': now}},
+                projection={'_id': 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
             if existing:
-                result = self.collection.update_one(
-                    {'symbol_name': symbol_name},
-                    {'$set': doc}
-                )
                 print(f"[OK] Updated symbol: {symbol_name}")
                 return existing['_id']
             else:
-                result = self.collection.insert_one(doc)
                 print(f"[OK] Uploaded symbol: {symbol_name}")
-                return result.inserted_id
+                return new_id
         
         except Exception as e:
             print(f"[ERROR] Upload failed: {e}")
@@ -110,15 +197,27 @@ class SymbolTemplate:
         try:
             doc = self.collection.find_one({'symbol_name': symbol_name})
             if doc:
-                image_data = doc['image_data']
-                nparr = np.frombuffer(image_data, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                return img
+                return self._decode_image(doc['image_data'])
             return None
         except Exception as e:
             print(f"[ERROR] Get symbol failed: {e}")
             return None
     
+    def get_all_symbols(self):
+        """Get all symbol templates in one query -> {symbol_name: image or None}"""
+        try:
+            docs = self.collection.find({}, {'symbol_name': 1, 'image_data': 1})
+            return {doc['symbol_name']: self._decode_image(doc['image_data']) for doc in docs}
+        except Exception as e:
+            print(f"[ERROR] Get symbols failed: {e}")
+            return {}
+    
+    @staticmethod
+    def _decode_image(image_data):
+        """Decode stored image bytes to a BGR array (None if undecodable)"""
+        nparr = np.frombuffer(image_data, np.uint8)
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    
     def list_symbols(self):
         """List all stored symbols"""
         try:
@@ -153,31 +252,48 @@ class SymbolDetector:
     def rasterize_pdf_page(pdf_path, page_idx=0, dpi=300):
         """Rasterize PDF page to image"""
         try:
-            doc = fitz.open(pdf_path)
-            if page_idx >= len(doc):
-                print(f"[ERROR] Page {page_idx} not found")
-                return None
-            
-            page = doc[page_idx]
+            with fitz.open(pdf_path) as doc:
+                if page_idx >= len(doc):
+                    print(f"[ERROR] Page {page_idx} not found")
+                    return None
+                return SymbolDetector.rasterize_page_obj(doc[page_idx], dpi)
+        except Exception as e:
+            print(f"[ERROR] Rasterize failed: {e}")
+            return None
+    
+    @staticmethod
+    def rasterize_page_obj(page, dpi=300):
+        """Rasterize an already loaded fitz page to a BGR image"""
+        try:
             zoom = dpi / 72.0
             mat = fitz.Matrix(zoom, zoom)
             pix = page.get_pixmap(matrix=mat, alpha=False)
             
-            mode = "RGB" if pix.n < 4 else "RGBA"
-            img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-            
-            return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+            # Zero-copy view over the pixmap samples; cvtColor makes the only copy
+            arr = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(
+                pix.height, pix.width, pix.n
+            )
+            if pix.n == 1:
+                return cv2.cvtColor(arr, cv2.COLOR_GRAY2BGR)
+            return cv2.cvtColor(arr[:, :, :3], cv2.COLOR_RGB2BGR)
         except Exception as e:
             print(f"[ERROR] Rasterize failed: {e}")
             return None
     
     @staticmethod
-    def preprocess_image(img):
-        """Preprocess image for template matching"""
+    def preprocess_image(img, nlm=True):
+        """
+        Preprocess image for template matching
+        
+        Non-local means denoising by default (the detection thresholds are
+        tuned for it); nlm=False swaps in a much faster 3x3 Gaussian, which
+        can lose matches near the threshold.
+        """
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         # Denoise
-        denoised = cv2.fastNlMeansDenoising(gray, h=10)
-        return denoised
+        if nlm:
+            return cv2.fastNlMeansDenoising(gray, h=10)
+        return cv2.GaussianBlur(gray, (3, 3), 0)
     
     @staticmethod
     def non_max_suppression(boxes, scores, iou_thresh=0.25):
@@ -185,7 +301,10 @@ class SymbolDetector:
         if len(boxes) == 0:
             return []
         
-        boxes = np.array(boxes, dtype=np.float32)
+        # Pixel boxes stay int32 (half the width of float64, exact arithmetic);
+        # fractional boxes fall back to float32
+        boxes = np.asarray(boxes)
+        boxes = boxes.astype(np.int32 if boxes.dtype.kind in 'iub' else np.float32, copy=False)
         scores = np.array(scores, dtype=np.float32)
         
         x1 = boxes[:, 0]
@@ -193,9 +312,17 @@ class SymbolDetector:
         x2 = boxes[:, 2]
         y2 = boxes[:, 3]
         
-        areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+        if HAS_CV2 and scores.min() > 0:
+            # OpenCV's native NMS. It takes x, y, w, h; the +1 keeps the
+            # inclusive-pixel areas used below. Its score threshold must be
+            # >= 0 and drops scores at or below it, hence the check above.
+            xywh = np.stack([x1, y1, x2 - x1 + 1, y2 - y1 + 1], axis=1).astype(np.float64)
+            idxs = cv2.dnn.NMSBoxes(xywh, scores, 0.0, iou_thresh)
+            return [int(i) for i in np.asarray(idxs).flatten()]
+        
         order = scores.argsort()[::-1]
         
+        areas = (x2 - x1 + 1).astype(np.int64) * (y2 - y1 + 1)
         keep = []
         while order.size > 0:
             i = order[0]
@@ -209,10 +336,11 @@ class SymbolDetector:
             xx2 = np.minimum(x2[i], x2[order[1:]])
             yy2 = np.minimum(y2[i], y2[order[1:]])
             
-            w = np.maximum(0.0, xx2 - xx1 + 1)
-            h = np.maximum(0.0, yy2 - yy1 + 1)
+            w = np.maximum(0, xx2 - xx1 + 1)
+            h = np.maximum(0, yy2 - yy1 + 1)
             
-            inter = w * h
+            # Only the ratio is computed in floating point
+            inter = w.astype(np.int64) * h
             ovr = inter / (areas[i] + areas[order[1:]] - inter + 1e-6)
             
             inds = np.where(ovr <= iou_thresh)[0]
@@ -220,10 +348,70 @@ class SymbolDetector:
         
         return keep
     
+    @staticmethod
+    def scale_template(template, scales=(0.5, 0.75, 1.0, 1.25, 1.5), factor=1.0):
+        """
+        Grayscale and resize a template once per scale -> [(resized, w, h)]
+        
+        factor: extra scale applied to every size, e.g. render DPI / template DPI.
+        """
+        hT, wT = template.shape[:2]
+        gray_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY) if len(template.shape) == 3 else template
+        
+        scaled = []
+        for s in scales:
+            new_w = int(wT * s * factor)
+            new_h = int(hT * s * factor)
+            
+            if new_w < 5 or new_h < 5:
+                continue
+            
+            resized = cv2.resize(gray_template, (new_w, new_h), interpolation=cv2.INTER_AREA)
+            scaled.append((resized, new_w, new_h))
+        return scaled
+    
+    @staticmethod
+    def scale_templates(symbol_templates_dict, scales=(0.5, 0.75, 1.0, 1.25, 1.5), factor=1.0):
+        """scale_template for every loaded template; missing templates are dropped"""
+        return {
+            symbol_name: SymbolDetector.scale_template(template_img, scales, factor)
+            for symbol_name, template_img in symbol_templates_dict.items()
+            if template_img is not None
+        }
+    
+    @staticmethod
+    def choose_dpi(symbol_templates_dict, template_dpi=300, target_diag=40.0, min_dpi=100):
+        """
+        Lowest render DPI that keeps the smallest template about target_diag
+        pixels across (templates are assumed to be cropped at template_dpi).
+        
+        matchTemplate cost grows with the page area, so large symbols can be
+        matched on a smaller raster without losing detections.
+        """
+        diags = [
+            np.hypot(*template_img.shape[:2])
+            for template_img in symbol_templates_dict.values()
+            if template_img is not None
+        ]
+        if not diags:
+            return template_dpi
+        dpi = template_dpi * target_diag / min(diags)
+        return int(round(max(min_dpi, min(template_dpi, dpi))))
+    
     @staticmethod
     def multi_scale_template_match(image, template, scales=(0.5, 0.75, 1.0, 1.25, 1.5), 
-                                   match_thresh=0.75, method=None):
-        """Multi-scale template matching"""
+                                   match_thresh=0.75, method=None, pre_gray=None,
+                                   scaled_template=None):
+        """
+        Multi-scale template matching
+        
+        pre_gray: the page already run through preprocess_image; pass it when
+        matching several templates against the same page so the page is
+        preprocessed only once.
+        scaled_template: output of scale_template, so the resizes are done
+        once per document instead of once per page (template/scales are then
+        ignored).
+        """
         if not HAS_CV2:
             print("[WARN] CV2 not available, returning empty detections")
             return []
@@ -232,99 +420,205 @@ class SymbolDetector:
         if method is None:
             method = cv2.TM_CCOEFF_NORMED
         
-        hT, wT = template.shape[:2]
         detections = []
         
-        gray_image = SymbolDetector.preprocess_image(image) if len(image.shape) == 3 else image
-        gray_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY) if len(template.shape) == 3 else template
+        if pre_gray is not None:
+            gray_image = pre_gray
+        else:
+            gray_image = SymbolDetector.preprocess_image(image) if len(image.shape) == 3 else image
+        if scaled_template is None:
+            scaled_template = SymbolDetector.scale_template(template, scales)
         
-        for s in scales:
-            new_w = int(wT * s)
-            new_h = int(hT * s)
-            
-            if new_w < 5 or new_h < 5:
-                continue
-            
+        for resized, new_w, new_h in scaled_template:
             if new_w > gray_image.shape[1] or new_h > gray_image.shape[0]:
                 continue
             
-            resized = cv2.resize(gray_template, (new_w, new_h), interpolation=cv2.INTER_AREA)
-            
             try:
                 res = cv2.matchTemplate(gray_image, resized, method)
-                loc = np.where(res >= match_thresh)
-                
-                for pt in zip(*loc[::-1]):
-                    score = float(res[pt[1], pt[0]])
-                    x1, y1 = pt[0], pt[1]
-                    x2, y2 = x1 + new_w, y1 + new_h
-                    detections.append(((x1, y1, x2, y2), score))
-            except Exception as e:
+            except cv2.error:
                 continue
+            detections.append(
+                SymbolDetector._collect_matches(res, match_thresh, new_w, new_h)
+            )
         
         # Apply NMS
         if not detections:
             return []
         
-        boxes = [d[0] for d in detections]
-        scores = [d[1] for d in detections]
+        boxes = np.concatenate([d[0] for d in detections])
+        scores = np.concatenate([d[1] for d in detections])
+        if len(boxes) == 0:
+            return []
         keep_idx = SymbolDetector.non_max_suppression(boxes, scores, iou_thresh=0.25)
         
-        return [{"bbox": list(boxes[i]), "score": float(scores[i])} for i in keep_idx]
+        return [{"bbox": boxes[i].tolist(), "score": float(scores[i])} for i in keep_idx]
+    
+    @staticmethod
+    def _collect_matches(res, match_thresh, w, h):
+        """Boxes (int32 [k, 4]) and scores (float32 [k]) where res >= match_thresh"""
+        # Compare in float32 like `res >= match_thresh` does
+        thresh = np.float32(match_thresh)
+        global HAS_NUMBA
+        if HAS_NUMBA:
+            try:
+                return _collect_boxes(res, thresh, w, h)
+            except Exception as e:
+                # e.g. a stale on-disk cache entry written under another
+                # module name; the NumPy path below gives the same boxes
+                print(f"[WARN] Numba match collection failed, using NumPy: {e}")
+                HAS_NUMBA = False
+        ys, xs = np.nonzero(res >= thresh)
+        boxes = np.stack([xs, ys, xs + w, ys + h], axis=1).astype(np.int32)
+        return boxes, res[ys, xs]
     
     @staticmethod
-    def detect_symbols_in_pdf(pdf_path, symbol_templates_dict, dpi=300, match_thresh=0.75):
-        """Detect all symbols in PDF"""
+    def detect_symbols_in_page(img, page_idx, scaled_templates, match_thresh=0.75, nlm=True):
+        """
+        Match every symbol template (from scale_templates) against one rasterized page
+        
+        nlm: denoise with non-local means (see preprocess_image); False uses
+        the faster Gaussian, which can lose matches near the threshold.
+        """
+        page_result = {
+            "page": page_idx + 1,
+            "image_width": img.shape[1],
+            "image_height": img.shape[0],
+            "symbols": []
+        }
+        
+        # Preprocess the page once for all templates
+        gray = SymbolDetector.preprocess_image(img, nlm) if len(img.shape) == 3 else img
+        
+        # Detect each symbol
+        for symbol_name, scaled_template in scaled_templates.items():
+            detections = SymbolDetector.multi_scale_template_match(
+                img, None,
+                match_thresh=match_thresh,
+                pre_gray=gray,
+                scaled_template=scaled_template
+            )
+            
+            page_result['symbols'].append({
+                "symbol_name": symbol_name,
+                "count": len(detections),
+                "detections": detections
+            })
+        
+        return page_result
+    
+    @staticmethod
+    def detect_symbols_in_pdf(pdf_path, symbol_templates_dict, dpi=300, match_thresh=0.75,
+                              workers=1, skip_scanned=False, auto_dpi=False, nlm=True):
+        """
+        Detect all symbols in PDF
+        
+        Pages are rasterized and matched in-process by default: the document
+        is opened once and every page rendered once. With workers > 1 they go
+        to a process pool instead (one task per page); each worker opens the
+        PDF once and receives the templates once through the pool initializer
+        (callers then need an ``if __name__ == "__main__"`` guard).
+        
+        skip_scanned: skip pages without a text layer (image-only scans),
+        which are left out of the results, before rendering them.
+        auto_dpi: treat dpi as the resolution the templates were cropped at
+        and render at the lower DPI picked by choose_dpi, scaling the
+        templates to match (results['dpi'] is the DPI actually used).
+        nlm: False swaps non-local means denoising for a much faster Gaussian
+        (see preprocess_image); the default thresholds are tuned for NLM.
+        """
+        # Templates are resized by render DPI / template DPI
+        factor = 1.0
+        if auto_dpi:
+            template_dpi = dpi
+            dpi = SymbolDetector.choose_dpi(symbol_templates_dict, template_dpi)
+            factor = dpi / template_dpi
+        
         results = {
             "file": pdf_path,
             "dpi": dpi,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "pages": []
         }
         
         try:
-            doc = fitz.open(pdf_path)
-            
-            for page_idx in range(len(doc)):
-                print(f"[*] Processing page {page_idx + 1}/{len(doc)}...")
+            with fitz.open(pdf_path) as doc:
+                page_count = len(doc)
                 
-                img = SymbolDetector.rasterize_pdf_page(pdf_path, page_idx, dpi)
-                if img is None:
-                    continue
+                # Resize the templates once for the whole document
+                scaled_templates = SymbolDetector.scale_templates(symbol_templates_dict, factor=factor)
                 
-                page_result = {
-                    "page": page_idx + 1,
-                    "image_width": img.shape[1],
-                    "image_height": img.shape[0],
-                    "symbols": []
-                }
+                page_indices = list(range(page_count))
+                if skip_scanned:
+                    page_indices = [
+                        page_idx for page_idx in page_indices
+                        if doc[page_idx].get_text("text").strip()
+                    ]
+                    skipped = page_count - len(page_indices)
+                    if skipped:
+                        print(f"[*] Skipping {skipped} page(s) without a text layer")
                 
-                # Detect each symbol
-                for symbol_name, template_img in symbol_templates_dict.items():
-                    if template_img is None:
-                        continue
-                    
-                    detections = SymbolDetector.multi_scale_template_match(
-                        img, template_img, 
-                        scales=(0.5, 0.75, 1.0, 1.25, 1.5),
-                        match_thresh=match_thresh
-                    )
-                    
-                    page_result['symbols'].append({
-                        "symbol_name": symbol_name,
-                        "count": len(detections),
-                        "detections": detections
-                    })
-                    
-                    print(f"  [{symbol_name}] Found: {len(detections)}")
+                workers = min(workers or 1, max(len(page_indices), 1))
                 
-                results['pages'].append(page_result)
+                if workers > 1:
+                    tasks = [(page_idx, dpi, match_thresh, nlm) for page_idx in page_indices]
+                    # Spawn, not fork: forking once numba's thread pool is
+                    # running (any earlier in-process detection) deadlocks
+                    with ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_detection_worker,
+                                             initargs=(pdf_path, scaled_templates)) as executor:
+                        page_results = executor.map(_detect_page_worker, tasks, chunksize=1)
+                        for page_idx, page_result in zip(page_indices, page_results):
+                            SymbolDetector._report_page(page_idx, page_count, page_result)
+                            if page_result is not None:
+                                results['pages'].append(page_result)
+                else:
+                    for page_idx in page_indices:
+                        img = SymbolDetector.rasterize_page_obj(doc[page_idx], dpi)
+                        page_result = None
+                        if img is not None:
+                            page_result = SymbolDetector.detect_symbols_in_page(
+                                img, page_idx, scaled_templates, match_thresh, nlm
+                            )
+                        SymbolDetector._report_page(page_idx, page_count, page_result)
+                        if page_result is not None:
+                            results['pages'].append(page_result)
             
             return results
         
         except Exception as e:
             print(f"[ERROR] Detection failed: {e}")
             return results
+    
+    @staticmethod
+    def _report_page(page_idx, page_count, page_result):
+        """Print per-page detection counts"""
+        print(f"[*] Processed page {page_idx + 1}/{page_count}")
+        if page_result is None:
+            return
+        for sym in page_result['symbols']:
+            print(f"  [{sym['symbol_name']}] Found: {sym['count']}")
+
+
+# Per-process state of a detection worker (set by the pool initializer)
+_WORKER_DOC = None
+_WORKER_TEMPLATES = None
+
+
+def _init_detection_worker(pdf_path, scaled_templates):
+    """Process pool initializer: open the PDF once and keep the scaled templates"""
+    global _WORKER_DOC, _WORKER_TEMPLATES
+    _WORKER_DOC = fitz.open(pdf_path)
+    _WORKER_TEMPLATES = scaled_templates
+
+
+def _detect_page_worker(task):
+    """Worker for SymbolDetector.detect_symbols_in_pdf: rasterize and match one page"""
+    page_idx, dpi, match_thresh, nlm = task
+    img = SymbolDetector.rasterize_page_obj(_WORKER_DOC[page_idx], dpi)
+    if img is None:
+        return None
+    return SymbolDetector.detect_symbols_in_page(img, page_idx, _WORKER_TEMPLATES, match_thresh, nlm)
 
 
 class SymbolDetectionDB:
@@ -353,19 +647,24 @@ class SymbolDetectionDB:
     def store_detection_results(self, pdf_filename, detection_results):
         """Store detection results"""
         try:
-            for page_result in detection_results['pages']:
-                doc = {
+            timestamp = datetime.now(timezone.utc)
+            docs = [
+                {
                     'filename': pdf_filename,
                     'page': page_result['page'],
                     'image_width': page_result['image_width'],
                     'image_height': page_result['image_height'],
                     'symbols': page_result['symbols'],
-                    'timestamp': datetime.utcnow(),
+                    'timestamp': timestamp,
                     'dpi': detection_results['dpi']
                 }
-                
-                result = self.collection.insert_one(doc)
-                print(f"[OK] Stored page {page_result['page']} detection results")
+                for page_result in detection_results['pages']
+            ]
+            
+            # One round-trip for all pages
+            if docs:
+                self.collection.insert_many(docs, ordered=False)
+            print(f"[OK] Stored detection results for {len(docs)} pages")
             
             return True
         except Exception as e:
@@ -417,7 +716,7 @@ def main():
         print("  python symbol_detector.py upload <symbol_name> <image_path>")
         print("  python symbol_detector.py list")
         print("  python symbol_detector.py delete <symbol_name>")
-        print("  python symbol_detector.py detect <pdf_path> [--store]")
+        print("  python symbol_detector.py detect <pdf_path> [--store] [--auto-dpi] [--workers N] [--fast-denoise] [--skip-scanned]")
         print("  python symbol_detector.py summary <filename>")
         sys.exit(1)
     
@@ -477,11 +776,20 @@ def main():
     
     elif command == "detect":
         if len(sys.argv) < 3:
-            print("[ERROR] Usage: symbol_detector.py detect <pdf_path> [--store]")
+            print("[ERROR] Usage: symbol_detector.py detect <pdf_path> [--store] [--auto-dpi] [--workers N] [--fast-denoise] [--skip-scanned]")
             sys.exit(1)
         
         pdf_path = sys.argv[2]
         store = '--store' in sys.argv
+        auto_dpi = '--auto-dpi' in sys.argv
+        # Gaussian instead of non-local means: much faster, may miss weak matches
+        nlm = '--fast-denoise' not in sys.argv
+        skip_scanned = '--skip-scanned' in sys.argv
+        workers = 1
+        if '--workers' in sys.argv:
+            idx = sys.argv.index('--workers')
+            if idx + 1 < len(sys.argv):
+                workers = int(sys.argv[idx + 1])
         
         if not Path(pdf_path).exists():
             print(f"[ERROR] File not found: {pdf_path}")
@@ -490,7 +798,7 @@ def main():
         try:
             # Get all symbols
             template_mgr = SymbolTemplate()
-            symbols = template_mgr.list_symbols()
+            symbols = template_mgr.get_all_symbols()
             
             if not symbols:
                 print("[ERROR] No symbols stored. Upload symbols first.")
@@ -499,11 +807,10 @@ def main():
             
             print(f"\n[*] Loading {len(symbols)} symbol templates...")
             templates_dict = {}
-            for sym in symbols:
-                img = template_mgr.get_symbol(sym['symbol_name'])
+            for symbol_name, img in symbols.items():
                 if img is not None:
-                    templates_dict[sym['symbol_name']] = img
-                    print(f"  [OK] {sym['symbol_name']}")
+                    templates_dict[symbol_name] = img
+                    print(f"  [OK] {symbol_name}")
             
             template_mgr.close()
             
@@ -512,7 +819,9 @@ def main():
             print("="*70)
             
             detector = SymbolDetector()
-            results = detector.detect_symbols_in_pdf(pdf_path, templates_dict, dpi=300, match_thresh=0.75)
+            results = detector.detect_symbols_in_pdf(pdf_path, templates_dict, dpi=300, match_thresh=0.75,
+                                                     workers=workers, auto_dpi=auto_dpi, nlm=nlm,
+                                                     skip_scanned=skip_scanned)
             
             # Print summary
             print("\n" + "="*70)
@@ -528,8 +837,7 @@ def main():
             
             # Export JSON
             output_file = f"{Path(pdf_path).stem}_symbol_detections.json"
-            with open(output_file, 'w') as f:
-                json.dump(results, f, indent=2, default=str)
+            write_json(results, output_file)
             print(f"\n[OK] Saved to: {output_file}")
             
             # Store in MongoDB
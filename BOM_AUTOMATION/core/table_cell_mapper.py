@@ -5,59 +5,187 @@ Extracts tables from CAD PDFs and maps cells as key-value pairs
 Stores structured table data in MongoDB
 """
 
+import atexit
+import hashlib
 import sys
 import json
 import re
 import os
+import zlib
+from bisect import bisect_left, bisect_right
+from itertools import chain
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 try:
-    import pdfplumber
-    from pymongo import MongoClient
+    from .page_pool import map_page_blocks, pool_workers
 except ImportError:
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", 
-                          "pdfplumber", "pymongo", "python-dotenv"])
-    import pdfplumber
-    from pymongo import MongoClient
+    # Run as a script from core/
+    from page_pool import map_page_blocks, pool_workers
+
+# Optional: faster JSON export
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
 
 load_dotenv()
 
+# pdfplumber and pymongo are imported where they are used, so importing this
+# module (or running it without --store-mongo) does not pay for pymongo/bson
+
+
+def _bootstrap():
+    """Install the runtime dependencies if they are missing (CLI entry only)"""
+    try:
+        import pdfplumber
+        import pymongo
+    except ImportError:
+        import subprocess
+        subprocess.check_call([sys.executable, "-m", "pip", "install", 
+                              "pdfplumber", "pymongo", "python-dotenv"])
+
+
+# Tables written to MongoDB per insert while streaming a PDF
+MONGO_BATCH_SIZE = 200
+# Writes per bulk_write command
+INSERT_CHUNK_SIZE = 1000
+
+# Per-table fields written by save_json_export
+EXPORT_FIELDS = ('page', 'table_index', 'raw_rows', 'raw_columns', 'key_value_pairs', 'header_data')
+
+# Table finder tolerances (points) for PdfiumBackend. These are
+# pdfplumber's own defaults, which PdfplumberBackend uses as they are, so
+# both backends find the same ruled tables
+SNAP_TOLERANCE = 3
+JOIN_TOLERANCE = 3
+EDGE_MIN_LENGTH = 3
+INTERSECTION_TOLERANCE = 3
+
+# Table extraction backend: 'pdfplumber' (default) or 'pdfium' (needs pypdfium2)
+TABLE_BACKEND = os.getenv('BOM_TABLE_BACKEND', 'pdfplumber').lower()
+
+# Header field patterns (compiled once)
+_ITEM_RE = re.compile(r'Item\s*no\.?\s*:\s*(\w+)', re.IGNORECASE)
+_MASS_RE = re.compile(r'Mass\s*\(kg\)\s*:\s*([\d.]+)', re.IGNORECASE)
+# The value ends at a line break or at the next '<label>:' in the same row
+_MATERIAL_RE = re.compile(
+    r'Material[^:\n]*:\s*([A-Z0-9\-\+\s\.]+?)(?=\s+[A-Z][A-Z .()/]*:|\s*(?:\n|$))', re.IGNORECASE
+)
+_DRAWING_RE = re.compile(r'Drawing\s*no\.?\s*:\s*(\d+)', re.IGNORECASE)
+_DATE_RE = re.compile(r'(\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4})')
+_SCALE_RE = re.compile(r'Scale\s*:\s*([\d:.]+)', re.IGNORECASE)
+_DESC_RE = re.compile(r'(?:Description|Proj)\s*:\s*(.+?)(?:\n|Scale|$)', re.IGNORECASE)
+
+# (field, pattern, lowercase labels that must appear in the row, converter)
+_HEADER_FIELDS = (
+    ('item_number', _ITEM_RE, ('item',), str),
+    ('mass_kg', _MASS_RE, ('mass',), float),
+    ('material', _MATERIAL_RE, ('material',), str.strip),
+    ('drawing_number', _DRAWING_RE, ('drawing',), str),
+    ('date', _DATE_RE, ('-', '/'), str),
+    ('scale', _SCALE_RE, ('scale',), str),
+    ('description', _DESC_RE, ('description', 'proj'), str.strip),
+)
+
+# Labels that mark a title-block table, in any of its rows
+_HEADER_HINT_RE = re.compile(
+    r'item no|mass|material|drawing|scale|date|description', re.IGNORECASE
+)
+
+# Cell and key cleanup: one pass over each maximal run of whitespace and
+# (cid:N) glyph codes; runs containing whitespace become a single space,
+# runs of glyph codes alone are dropped
+_CLEAN_RE = re.compile(r'(?:\(cid:\d+\))*(\s)(?:\s|\(cid:\d+\))*|(?:\(cid:\d+\))+')
+_KEY_CLEAN_RE = re.compile(r'[^a-zA-Z0-9_\s]')
+# ASCII fast path for the same cleanup: drops what _KEY_CLEAN_RE drops and
+# lowercases in the same C-level pass
+_KEY_TABLE = {
+    c: (chr(c).lower() if chr(c).isalnum() or chr(c).isspace() or chr(c) == '_' else None)
+    for c in range(128)
+}
+
+
+def _clean_repl(match):
+    return ' ' if match.group(1) else ''
+
+
+def _looks_like_header(table):
+    """Cheap title-block check, one regex search per row; part listings usually fail it"""
+    return any(
+        _HEADER_HINT_RE.search(' '.join(str(cell) for cell in row if cell))
+        for row in table
+    )
+
+
+def _normalize_key(key):
+    """Turn a cleaned key cell into a snake_case key (special chars removed)"""
+    if key.isascii():
+        return key.translate(_KEY_TABLE).strip().replace(' ', '_')
+    return _KEY_CLEAN_RE.sub('', key).strip().replace(' ', '_').lower()
+
+
 class TableExtractor:
     """Extract and map table cells as key-value pairs"""
     
+    __slots__ = ('pdf_path', 'tables', 'extracted_tables')
+    
     def __init__(self, pdf_path):
         self.pdf_path = pdf_path
         self.tables = []
         self.extracted_tables = {}
     
-    def extract_tables(self):
+    def extract_tables(self, workers=None):
         """Extract all tables from PDF"""
-        with pdfplumber.open(self.pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                tables = page.extract_tables()
-                if tables:
-                    print(f"[OK] Found {len(tables)} table(s) on page {page_num}")
-                    for table_idx, table in enumerate(tables):
-                        self.tables.append({
-                            'page': page_num,
-                            'table_index': table_idx,
-                            'raw_data': table
-                        })
+        self.tables.extend(self.iter_tables(workers))
         return self.tables
     
+    def iter_tables(self, workers=None):
+        """
+        Yield tables one at a time, in page order, as pages are parsed
+        
+        Pages are parsed in-process unless the PDF is long enough for a
+        process pool to pay off (see page_pool.pool_workers); pdfminer is
+        pure Python, so threads would not help. Pass workers to force a
+        pool size, or workers=1 to always parse in-process.
+        """
+        page_count = _get_backend().page_count(self.pdf_path)
+        
+        page_nums = range(1, page_count + 1)
+        workers = pool_workers(page_count, workers)
+        yield from self._table_infos(
+            map_page_blocks(_extract_page_tables, self.pdf_path, page_nums, workers)
+        )
+    
+    @staticmethod
+    def _table_infos(page_tables):
+        """Flatten [(page_num, tables)] into table info dicts"""
+        for page_num, tables in page_tables:
+            if tables:
+                print(f"[OK] Found {len(tables)} table(s) on page {page_num}")
+                for table_idx, table in enumerate(tables):
+                    yield {
+                        'page': page_num,
+                        'table_index': table_idx,
+                        'raw_data': table
+                    }
+    
     def clean_cell_value(self, value):
         """Clean and normalize cell value"""
         if value is None:
             return None
         if isinstance(value, str):
-            # Remove extra whitespace and special characters
-            cleaned = value.strip()
-            # Remove embedded unicode characters like (cid:1)
-            cleaned = re.sub(r'\(cid:\d+\)', '', cleaned)
-            cleaned = re.sub(r'\s+', ' ', cleaned)  # Normalize spaces
+            if '(cid:' not in value:
+                # Common case: only whitespace to normalize; str.split() uses
+                # the same whitespace definition as the regex's \s
+                cleaned = ' '.join(value.split())
+            else:
+                # Remove embedded unicode characters like (cid:1) and normalize
+                # spaces in a single pass
+                cleaned = _CLEAN_RE.sub(_clean_repl, value).strip()
             return cleaned if cleaned else None
         return value
     
@@ -76,7 +204,7 @@ class TableExtractor:
                 
                 if key and value and len(key) > 0 and len(value) > 0:
                     # Clean key (remove special chars, normalize)
-                    key_clean = re.sub(r'[^a-zA-Z0-9_\s]', '', key).strip().replace(' ', '_').lower()
+                    key_clean = _normalize_key(key)
                     if key_clean:
                         key_values[key_clean] = value
         
@@ -84,59 +212,52 @@ class TableExtractor:
     
     def extract_header_data(self, table):
         """Extract header information as key-value pairs"""
-        header_data = {}
+        found = {}
+        # Fields whose label was seen in a row that did not hold its value
+        unmatched = []
         
-        # Look for common header patterns
-        all_text = []
+        # Most header fields sit in one row, so scan row by row and stop
+        # once every field has been seen
         for row in table:
-            for cell in row:
-                if cell:
-                    all_text.append(str(cell))
-        
-        full_text = ' '.join(all_text)
-        
-        # Item Number
-        match = re.search(r'Item\s*no\.?\s*:\s*(\w+)', full_text, re.IGNORECASE)
-        if match:
-            header_data['item_number'] = match.group(1)
-        
-        # Mass/Weight
-        match = re.search(r'Mass\s*\(kg\)\s*:\s*([\d.]+)', full_text, re.IGNORECASE)
-        if match:
-            header_data['mass_kg'] = float(match.group(1))
-        
-        # Material
-        match = re.search(r'Material\s*/?.*?:\s*([A-Z0-9\-\+\s\.]+?)(?:\n|$)', full_text, re.IGNORECASE)
-        if match:
-            header_data['material'] = match.group(1).strip()
-        
-        # Drawing Number
-        match = re.search(r'Drawing\s*no\.?\s*:\s*(\d+)', full_text, re.IGNORECASE)
-        if match:
-            header_data['drawing_number'] = match.group(1)
+            row_text = ' '.join(str(cell) for cell in row if cell)
+            if not row_text:
+                continue
+            # Cheap substring checks so each regex only runs when its label is present
+            lower_text = row_text.lower()
+            for entry in _HEADER_FIELDS:
+                field, pattern, labels, convert = entry
+                if field in found or not any(label in lower_text for label in labels):
+                    continue
+                match = pattern.search(row_text)
+                if match:
+                    found[field] = convert(match.group(1))
+                elif entry not in unmatched:
+                    unmatched.append(entry)
+            if len(found) == len(_HEADER_FIELDS):
+                break
         
-        # Date
-        match = re.search(r'(\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4})', full_text)
-        if match:
-            header_data['date'] = match.group(1)
+        # A label in one row with its value in the next: retry those fields
+        # on the whole table joined into one string
+        unmatched = [entry for entry in unmatched if entry[0] not in found]
+        if unmatched:
+            full_text = ' '.join(str(cell) for row in table for cell in row if cell)
+            for field, pattern, labels, convert in unmatched:
+                match = pattern.search(full_text)
+                if match:
+                    found[field] = convert(match.group(1))
         
-        # Scale
-        match = re.search(r'Scale\s*:\s*([\d:.]+)', full_text, re.IGNORECASE)
-        if match:
-            header_data['scale'] = match.group(1)
-        
-        # Description/Title
-        match = re.search(r'(?:Description|Proj)\s*:\s*(.+?)(?:\n|Scale|$)', full_text, re.IGNORECASE)
-        if match:
-            header_data['description'] = match.group(1).strip()
-        
-        return header_data
+        # Keep the usual field order regardless of where each was found
+        return {field: found[field] for field, *_ in _HEADER_FIELDS if field in found}
     
     def extract_all_tables_as_kv(self):
         """Extract all tables and convert to key-value pairs"""
-        result = {}
-        
-        for idx, table_info in enumerate(self.tables):
+        result = dict(self.iter_tables_as_kv(self.tables))
+        self.extracted_tables = result
+        return result
+    
+    def iter_tables_as_kv(self, tables):
+        """Yield (table_key, table_data) for each table info from extract_tables/iter_tables"""
+        for idx, table_info in enumerate(tables):
             table = table_info['raw_data']
             page = table_info['page']
             
@@ -144,9 +265,9 @@ class TableExtractor:
             
             # Extract key-value pairs from table
             kv_pairs = self.extract_key_value_from_table(table)
-            header_data = self.extract_header_data(table)
+            header_data = self.extract_header_data(table) if _looks_like_header(table) else {}
             
-            result[table_key] = {
+            yield table_key, {
                 'page': page,
                 'table_index': idx,
                 'raw_rows': len(table),
@@ -155,14 +276,401 @@ class TableExtractor:
                 'header_data': header_data,
                 'raw_table': table
             }
+
+
+class PdfplumberBackend:
+    """Table extraction with pdfplumber's table finder (the default backend)"""
+    
+    @staticmethod
+    def page_count(pdf_path):
+        import pdfplumber
         
-        self.extracted_tables = result
-        return result
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+    
+    @staticmethod
+    def extract_tables(pdf_path, page_nums):
+        """[(page_num, tables)] for the given 1-based pages"""
+        import pdfplumber
+        
+        results = []
+        with pdfplumber.open(pdf_path, pages=page_nums) as pdf:
+            for page in pdf.pages:
+                results.append((page.page_number, page.extract_tables()))
+                # Drop the page's cached chars/objects before moving on
+                page.close()
+        return results
+
+
+class PdfiumBackend:
+    """
+    Bordered (lattice) table extraction on PDFium via pypdfium2
+    
+    Ruling lines are taken from the page's path objects and snapped and
+    joined into edges. Cells and tables are then built the way pdfplumber's
+    'lines' strategy does: a cell is the smallest rectangle whose corners
+    are edge intersections connected by edges, and cells sharing a corner
+    form a table. Cell text is read from the PDFium text page, so no
+    pdfminer layout pass is needed.
+    """
+    
+    @staticmethod
+    def page_count(pdf_path):
+        import pypdfium2 as pdfium
+        
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    
+    @classmethod
+    def extract_tables(cls, pdf_path, page_nums):
+        """[(page_num, tables)] for the given 1-based pages"""
+        import pypdfium2 as pdfium
+        
+        results = []
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            for page_num in page_nums:
+                page = pdf[page_num - 1]
+                textpage = page.get_textpage()
+                try:
+                    results.append((page_num, cls._page_tables(page, textpage)))
+                finally:
+                    textpage.close()
+                    page.close()
+        finally:
+            pdf.close()
+        return results
+    
+    @classmethod
+    def _page_tables(cls, page, textpage):
+        snap = SNAP_TOLERANCE
+        join = JOIN_TOLERANCE
+        min_length = EDGE_MIN_LENGTH
+        # Like pdfplumber, snap and join everything longer than 1pt, then
+        # drop edges that are still short
+        horizontal, vertical = cls._ruling_segments(page, 1)
+        horizontal = [edge for edge in cls._merge_segments(horizontal, snap, join)
+                      if edge[2] - edge[1] >= min_length]
+        vertical = [edge for edge in cls._merge_segments(vertical, snap, join)
+                    if edge[2] - edge[1] >= min_length]
+        intersections = cls._intersections(horizontal, vertical, INTERSECTION_TOLERANCE)
+        
+        tables = []
+        chars = None
+        for cells in cls._cells_to_tables(cls._intersections_to_cells(intersections)):
+            if chars is None:
+                chars = cls._page_chars(textpage)
+                char_mids = [char[0] for char in chars]
+            # Rows by cell top, columns by every distinct cell left edge;
+            # positions covered by a merged cell are None, as in pdfplumber
+            xs = sorted({cell[0] for cell in cells})
+            rows = {}
+            for cell in cells:
+                rows.setdefault(cell[1], {})[cell[0]] = cell
+            table = []
+            for top in sorted(rows):
+                row = rows[top]
+                table.append([
+                    cls._cell_text(chars, char_mids, row[x]) if x in row else None
+                    for x in xs
+                ])
+            tables.append((min(cell[1] for cell in cells), xs[0], table))
+        
+        # Same order as pdfplumber: top to bottom, then left to right
+        tables.sort(key=lambda table: table[:2])
+        return [table for _, _, table in tables]
+    
+    @staticmethod
+    def _ruling_segments(page, min_length):
+        """Axis-aligned straight path segments in page space: ([(y, x0, x1)], [(x, y0, y1)])"""
+        import ctypes
+        import pypdfium2.raw as pdfium_c
+        
+        horizontal, vertical = [], []
+        x, y = ctypes.c_float(), ctypes.c_float()
+        for obj in page.get_objects(filter=(pdfium_c.FPDF_PAGEOBJ_PATH,)):
+            # Compose the path's matrix with those of any enclosing Form XObjects
+            a, b, c, d, e, f = obj.get_matrix().get()
+            container = obj.container
+            while container is not None:
+                a2, b2, c2, d2, e2, f2 = container.get_matrix().get()
+                a, b, c, d, e, f = (a * a2 + b * c2, a * b2 + b * d2,
+                                    c * a2 + d * c2, c * b2 + d * d2,
+                                    e * a2 + f * c2 + e2, e * b2 + f * d2 + f2)
+                container = container.container
+            
+            start = current = None
+            for i in range(pdfium_c.FPDFPath_CountSegments(obj)):
+                segment = pdfium_c.FPDFPath_GetPathSegment(obj, i)
+                pdfium_c.FPDFPathSegment_GetPoint(segment, x, y)
+                point = (a * x.value + c * y.value + e, b * x.value + d * y.value + f)
+                kind = pdfium_c.FPDFPathSegment_GetType(segment)
+                
+                ends = []
+                if kind == pdfium_c.FPDF_SEGMENT_MOVETO:
+                    start = point
+                elif kind == pdfium_c.FPDF_SEGMENT_LINETO and current is not None:
+                    ends.append((current, point))
+                # Bezier curves are never ruling lines; just move along them
+                current = point
+                if pdfium_c.FPDFPathSegment_GetClose(segment) and start is not None:
+                    ends.append((current, start))
+                    current = start
+                
+                for (x0, y0), (x1, y1) in ends:
+                    if abs(y1 - y0) < 0.01 and abs(x1 - x0) >= min_length:
+                        horizontal.append(((y0 + y1) / 2, min(x0, x1), max(x0, x1)))
+                    elif abs(x1 - x0) < 0.01 and abs(y1 - y0) >= min_length:
+                        vertical.append(((x0 + x1) / 2, min(y0, y1), max(y0, y1)))
+        return horizontal, vertical
+    
+    @staticmethod
+    def _merge_segments(segments, snap, join):
+        """Snap (pos, lo, hi) segments to shared positions and join collinear overlaps"""
+        merged = []
+        segments = sorted(segments)
+        i = 0
+        while i < len(segments):
+            # A run of positions each within snap of the previous one shares
+            # their average position (pdfplumber's snap clustering)
+            j = i + 1
+            while j < len(segments) and segments[j][0] - segments[j - 1][0] <= snap:
+                j += 1
+            group = segments[i:j]
+            pos = sum(segment[0] for segment in group) / len(group)
+            lo, hi = None, None
+            for _, seg_lo, seg_hi in sorted(group, key=lambda segment: segment[1]):
+                if hi is not None and seg_lo <= hi + join:
+                    hi = max(hi, seg_hi)
+                else:
+                    if hi is not None:
+                        merged.append((pos, lo, hi))
+                    lo, hi = seg_lo, seg_hi
+            merged.append((pos, lo, hi))
+            i = j
+        return merged
+    
+    @staticmethod
+    def _intersections(horizontal, vertical, tol):
+        """
+        {(x, top): (h_edge_ids, v_edge_ids)} where edges cross or touch
+        
+        top is the negated PDF y, so it grows downwards like pdfplumber's.
+        """
+        intersections = {}
+        v_order = sorted(range(len(vertical)), key=lambda k: vertical[k][0])
+        v_xs = [vertical[k][0] for k in v_order]
+        for h_id, (y, x0, x1) in enumerate(horizontal):
+            for v_id in v_order[bisect_left(v_xs, x0 - tol):bisect_right(v_xs, x1 + tol)]:
+                x, y0, y1 = vertical[v_id]
+                if y0 - tol <= y <= y1 + tol:
+                    h_ids, v_ids = intersections.setdefault((x, -y), (set(), set()))
+                    h_ids.add(h_id)
+                    v_ids.add(v_id)
+        return intersections
+    
+    @staticmethod
+    def _intersections_to_cells(intersections):
+        """(x0, top, x1, bottom) of the smallest edge-bounded rectangle below-right of each intersection"""
+        by_x, by_top = {}, {}
+        for x, top in intersections:
+            by_x.setdefault(x, []).append(top)
+            by_top.setdefault(top, []).append(x)
+        for values in chain(by_x.values(), by_top.values()):
+            values.sort()
+        
+        def connected_h(p1, p2):
+            return bool(intersections[p1][0] & intersections[p2][0])
+        
+        def connected_v(p1, p2):
+            return bool(intersections[p1][1] & intersections[p2][1])
+        
+        cells = []
+        for point in sorted(intersections):
+            x, top = point
+            tops = by_x[x]
+            xs = by_top[top]
+            cell = None
+            for bottom in tops[bisect_right(tops, top):]:
+                below = (x, bottom)
+                if not connected_v(point, below):
+                    continue
+                for right_x in xs[bisect_right(xs, x):]:
+                    right = (right_x, top)
+                    if not connected_h(point, right):
+                        continue
+                    corner = (right_x, bottom)
+                    if (corner in intersections and connected_v(corner, right)
+                            and connected_h(corner, below)):
+                        cell = (x, top, right_x, bottom)
+                        break
+                if cell:
+                    break
+            if cell:
+                cells.append(cell)
+        return cells
+    
+    @staticmethod
+    def _cells_to_tables(cells):
+        """Group cells that share a corner; tables of a single cell are dropped"""
+        parent = list(range(len(cells)))
+        
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+        
+        corner_owner = {}
+        for idx, (x0, top, x1, bottom) in enumerate(cells):
+            for corner in ((x0, top), (x1, top), (x0, bottom), (x1, bottom)):
+                owner = corner_owner.setdefault(corner, idx)
+                if owner != idx:
+                    parent[find(idx)] = find(owner)
+        
+        tables = {}
+        for idx, cell in enumerate(cells):
+            tables.setdefault(find(idx), []).append(cell)
+        return [table for table in tables.values() if len(table) > 1]
+    
+    @staticmethod
+    def _page_chars(textpage):
+        """
+        [(v_mid, h_mid, top, x0, x1, char)] sorted by v_mid, for the page's
+        real characters (top/v_mid are negated PDF y, growing downwards)
+        """
+        import pypdfium2.raw as pdfium_c
+        
+        chars = []
+        for i in range(textpage.count_chars()):
+            if pdfium_c.FPDFText_IsGenerated(textpage, i) == 1:
+                continue
+            char = chr(pdfium_c.FPDFText_GetUnicode(textpage, i))
+            left, bottom, right, top = textpage.get_charbox(i, loose=True)
+            chars.append((-(top + bottom) / 2, (left + right) / 2, -top, left, right, char))
+        chars.sort()
+        return chars
+    
+    @staticmethod
+    def _cell_text(chars, char_mids, cell):
+        """
+        Text of the characters centred in the cell, laid out like pdfplumber:
+        lines by top (3pt tolerance), words split on blanks or 3pt gaps
+        """
+        x0, top, x1, bottom = cell
+        lines = []
+        cell_chars = sorted(
+            (char[2], char[3], char[4], char[5])
+            for char in chars[bisect_left(char_mids, top):bisect_right(char_mids, bottom)]
+            if x0 <= char[1] <= x1
+        )
+        for char in cell_chars:
+            if lines and char[0] - lines[-1][-1][0] <= 3:
+                lines[-1].append(char)
+            else:
+                lines.append([char])
+        
+        text_lines = []
+        for line in lines:
+            words, word, last_x1 = [], '', None
+            for _, left, right, char in sorted(line, key=lambda char: char[1]):
+                if char.isspace() or (last_x1 is not None and left - last_x1 > 3):
+                    if word:
+                        words.append(word)
+                    word = ''
+                if not char.isspace() and char.isprintable():
+                    word += char
+                last_x1 = right
+            if word:
+                words.append(word)
+            if words:
+                text_lines.append(' '.join(words))
+        return '\n'.join(text_lines)
+
+
+_BACKEND = None
+
+
+def _get_backend():
+    """Table backend selected by BOM_TABLE_BACKEND (pdfplumber or pdfium), resolved once"""
+    global _BACKEND
+    if _BACKEND is None:
+        _BACKEND = PdfplumberBackend
+        if TABLE_BACKEND == 'pdfium':
+            try:
+                import pypdfium2  # availability check only
+                _BACKEND = PdfiumBackend
+            except ImportError:
+                print("[WARN] pypdfium2 not installed, using pdfplumber table backend")
+        elif TABLE_BACKEND != 'pdfplumber':
+            print(f"[WARN] Unknown BOM_TABLE_BACKEND '{TABLE_BACKEND}', using pdfplumber")
+    return _BACKEND
+
+
+def _extract_page_tables(pdf_path, page_nums):
+    """Worker for TableExtractor.extract_tables: [(page_num, tables)] for the given 1-based pages"""
+    return _get_backend().extract_tables(pdf_path, page_nums)
+
+
+# Process-wide MongoClient; it is thread-safe and pools its own connections
+_CLIENT = None
+
+
+def _get_client(mongo_uri):
+    """Return the shared MongoClient, creating it on first use"""
+    global _CLIENT
+    if _CLIENT is None:
+        from pymongo import MongoClient
+        
+        _CLIENT = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        atexit.register(_close_client)
+    return _CLIENT
+
+
+def _close_client():
+    """Close the shared MongoClient; the next _get_client() opens a new one"""
+    global _CLIENT
+    if _CLIENT is not None:
+        _CLIENT.close()
+        _CLIENT = None
+
+
+def table_content_hash(raw_table):
+    """128-bit BLAKE2b hex digest of a raw cell grid's JSON form"""
+    if HAS_ORJSON:
+        payload = orjson.dumps(raw_table)
+    else:
+        payload = json.dumps(raw_table, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def pack_raw_table(raw_table):
+    """Serialize a raw cell grid to a compressed BSON binary"""
+    if HAS_ORJSON:
+        payload = orjson.dumps(raw_table)
+    else:
+        payload = json.dumps(raw_table, ensure_ascii=False).encode('utf-8')
+    from bson import Binary
+    
+    return Binary(zlib.compress(payload, 1))
+
+
+def unpack_raw_table(blob):
+    """Inverse of pack_raw_table"""
+    return json.loads(zlib.decompress(blob))
 
 
 class MongoTableStorage:
     """Store extracted table data in MongoDB"""
     
+    # (db_name, collection_name) pairs already indexed in this process
+    _indexed_collections = set()
+    
+    __slots__ = ('mongo_uri', 'db_name', 'collection_name', 'client', 'db', 'collection')
+    
     def __init__(self, db_name="utkarshproduction", collection_name="TABLE_MAPPINGS"):
         mongo_uri = os.getenv("MONGO_URI")
         if not mongo_uri:
@@ -176,9 +684,9 @@ class MongoTableStorage:
         self.collection = None
     
     def connect(self):
-        """Connect to MongoDB"""
+        """Connect to MongoDB (reusing the process-wide client)"""
         try:
-            self.client = MongoClient(self.mongo_uri, serverSelectionTimeoutMS=5000)
+            self.client = _get_client(self.mongo_uri)
             self.client.admin.command('ping')
             self.db = self.client[self.db_name]
             self.collection = self.db[self.collection_name]
@@ -191,39 +699,79 @@ class MongoTableStorage:
             return False
     
     def create_indexes(self):
-        """Create indexes for fast queries"""
+        """Create indexes for fast queries (once per collection per process)"""
+        key = (self.db_name, self.collection_name)
+        if key in MongoTableStorage._indexed_collections:
+            return
         try:
-            self.collection.create_index([("filename", 1)])
-            self.collection.create_index([("page", 1)])
-            self.collection.create_index([("table_index", 1)])
-            self.collection.create_index([("import_date", -1)])
+            from pymongo import IndexModel
+            
+            self.collection.create_indexes([
+                IndexModel([("filename", 1)]),
+                IndexModel([("page", 1)]),
+                IndexModel([("table_index", 1)]),
+                IndexModel([("import_date", -1)]),
+                # Dedup key; partial so older documents without a hash don't collide
+                IndexModel([("filename", 1), ("content_hash", 1)], unique=True,
+                           partialFilterExpression={"content_hash": {"$exists": True}}),
+            ])
+            MongoTableStorage._indexed_collections.add(key)
             print("[OK] Indexes created")
         except Exception as e:
             print(f"[WARN] Index creation: {e}")
     
-    def store_table_mapping(self, filename, extracted_tables):
-        """Store extracted table mappings in MongoDB"""
+    def store_table_mapping(self, filename, extracted_tables, store_raw=False):
+        """
+        Store extracted table mappings in MongoDB
+        
+        Tables are keyed by (filename, content_hash), so a title block
+        repeated on every sheet, or a re-imported file, is stored once.
+        The raw cell grid is only kept when store_raw is set, and then as a
+        zlib-compressed JSON blob under 'raw_table_gz' (see unpack_raw_table).
+        
+        Returns the number of newly stored tables, or None on failure.
+        Nothing is printed per table; callers report a summary.
+        """
         try:
-            for table_key, table_data in extracted_tables.items():
+            from pymongo import UpdateOne
+            
+            now = datetime.now(timezone.utc)
+            docs = {}
+            for table_data in extracted_tables.values():
+                content_hash = table_content_hash(table_data['raw_table'])
+                if content_hash in docs:
+                    continue
                 doc = {
                     'filename': filename,
+                    'content_hash': content_hash,
                     'page': table_data['page'],
                     'table_index': table_data['table_index'],
                     'raw_rows': table_data['raw_rows'],
                     'raw_columns': table_data['raw_columns'],
                     'key_value_pairs': table_data['key_value_pairs'],
                     'header_data': table_data['header_data'],
-                    'import_date': datetime.utcnow(),
-                    'raw_table': table_data['raw_table']
+                    'import_date': now
                 }
-                
-                result = self.collection.insert_one(doc)
-                print(f"[OK] Stored table mapping: {result.inserted_id}")
+                if store_raw:
+                    doc['raw_table_gz'] = pack_raw_table(table_data['raw_table'])
+                docs[content_hash] = doc
             
-            return True
+            requests = [
+                UpdateOne({'filename': filename, 'content_hash': content_hash},
+                          {'$setOnInsert': doc}, upsert=True)
+                for content_hash, doc in docs.items()
+            ]
+            
+            # Bulk upsert, chunked to keep each command well under the 16 MB limit
+            inserted = 0
+            for i in range(0, len(requests), INSERT_CHUNK_SIZE):
+                result = self.collection.bulk_write(requests[i:i + INSERT_CHUNK_SIZE], ordered=False)
+                inserted += result.upserted_count
+            
+            return inserted
         except Exception as e:
             print(f"[ERROR] Failed to store table mapping: {e}")
-            return False
+            return None
     
     def query_all_mappings(self):
         """Query all table mappings"""
@@ -246,8 +794,11 @@ class MongoTableStorage:
     def close(self):
         """Close connection"""
         if self.client:
-            self.client.close()
+            _close_client()
             print("[OK] MongoDB connection closed")
+        self.client = None
+        self.db = None
+        self.collection = None
 
 
 def print_table_summary(extracted_tables):
@@ -278,57 +829,102 @@ def print_table_summary(extracted_tables):
     print("\n" + "="*80)
 
 
+def _dumps_indented(obj):
+    """obj as UTF-8 JSON with 2-space indent (orjson when available)"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+
 def save_json_export(data, output_path):
-    """Save extracted mappings as JSON"""
-    # Convert to JSON-serializable format
-    json_data = {}
-    for key, table in data.items():
-        json_data[key] = {
-            'page': table['page'],
-            'table_index': table['table_index'],
-            'raw_rows': table['raw_rows'],
-            'raw_columns': table['raw_columns'],
-            'key_value_pairs': table['key_value_pairs'],
-            'header_data': table['header_data']
-        }
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, indent=2, ensure_ascii=False)
+    """
+    Save extracted mappings as JSON
+    
+    Tables are serialized and written one at a time, so no second copy of
+    the whole export is built in memory. The output is the same as an
+    indent=2 dump of the full {key: table} dict.
+    """
+    with open(output_path, 'wb') as f:
+        separator = b'{\n  '
+        for key, table in data.items():
+            entry = {field: table[field] for field in EXPORT_FIELDS}
+            f.write(separator)
+            f.write(_dumps_indented(key))
+            f.write(b': ')
+            # Nest one level: string values never contain a raw newline
+            f.write(_dumps_indented(entry).replace(b'\n', b'\n  '))
+            separator = b',\n  '
+        f.write(b'\n}' if data else b'{}')
     print(f"[OK] Saved JSON export to: {output_path}")
 
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python table_cell_mapper.py <pdf_path> [--store-mongo]")
+        print("Usage: python table_cell_mapper.py <pdf_path> [--store-mongo] [--store-raw]")
         print("\nExample:")
         print("  python table_cell_mapper.py H.pdf")
         print("  python table_cell_mapper.py H.pdf --store-mongo")
+        print("  python table_cell_mapper.py H.pdf --store-mongo --store-raw  # keep raw cells (compressed)")
         sys.exit(1)
     
     pdf_path = sys.argv[1]
     store_mongo = '--store-mongo' in sys.argv
+    store_raw = '--store-raw' in sys.argv
     
     if not Path(pdf_path).exists():
         print(f"[ERROR] File not found: {pdf_path}")
         sys.exit(1)
     
+    _bootstrap()
+    
     print("\n" + "="*80)
     print("PDF TABLE CELL EXTRACTOR - KEY-VALUE MAPPER")
     print("="*80)
     
-    # Extract tables
+    storage = None
+    if store_mongo:
+        storage = MongoTableStorage()
+        if storage.connect():
+            storage.create_indexes()
+        else:
+            storage = None
+    
+    # Extract tables and convert to key-value pairs page by page. Tables are
+    # written to MongoDB in batches as they come; only the mappings (without
+    # the raw cells) are kept for the summary and JSON export.
     print(f"\n[*] Extracting tables from: {pdf_path}")
     extractor = TableExtractor(pdf_path)
-    tables = extractor.extract_tables()
+    extracted_tables = {}
+    batch = {}
+    stored = 0
+    duplicates = 0
     
-    if not tables:
+    for table_key, table_data in extractor.iter_tables_as_kv(extractor.iter_tables()):
+        extracted_tables[table_key] = {k: v for k, v in table_data.items() if k != 'raw_table'}
+        if storage:
+            batch[table_key] = table_data
+            if len(batch) >= MONGO_BATCH_SIZE:
+                inserted = storage.store_table_mapping(pdf_path, batch, store_raw)
+                if inserted is not None:
+                    stored += inserted
+                    duplicates += len(batch) - inserted
+                batch = {}
+    
+    if storage:
+        if batch:
+            inserted = storage.store_table_mapping(pdf_path, batch, store_raw)
+            if inserted is not None:
+                stored += inserted
+                duplicates += len(batch) - inserted
+        if stored or duplicates:
+            print(f"[OK] Stored {stored} table(s) in MongoDB"
+                  + (f", skipped {duplicates} duplicate(s)" if duplicates else ""))
+        storage.close()
+    
+    if not extracted_tables:
         print("[WARN] No tables found in PDF")
         sys.exit(0)
     
-    # Convert to key-value pairs
-    print(f"\n[*] Converting {len(tables)} table(s) to key-value pairs...")
-    extracted_tables = extractor.extract_all_tables_as_kv()
-    
     # Print summary
     print_table_summary(extracted_tables)
     
@@ -336,16 +932,6 @@ def main():
     json_path = str(Path(pdf_path).stem) + "_table_mappings.json"
     save_json_export(extracted_tables, json_path)
     
-    # Store in MongoDB
-    if store_mongo:
-        print("\n[*] Storing table mappings in MongoDB...")
-        storage = MongoTableStorage()
-        if storage.connect():
-            storage.create_indexes()
-            if storage.store_table_mapping(pdf_path, extracted_tables):
-                print(f"[OK] Stored {len(extracted_tables)} table(s) in MongoDB")
-            storage.close()
-    
     print("\n" + "="*80)
     print("EXTRACTION COMPLETE")
     print("="*80 + "\n")
@@ -6,31 +6,75 @@ Uses multiple detection methods for maximum accuracy
 """
 
 import sys
+import argparse
+import csv
 import json
+import hashlib
 import re
+import signal
+from html import escape
+import threading
 from pathlib import Path
 from datetime import datetime
 from collections import defaultdict
 
 try:
     import pdfplumber
-    import pandas as pd
     import numpy as np
 except ImportError:
     import subprocess
     subprocess.check_call([sys.executable, "-m", "pip", "install", 
-                          "pdfplumber", "pandas", "numpy", "openpyxl"])
+                          "pdfplumber", "numpy", "openpyxl"])
     import pdfplumber
-    import pandas as pd
     import numpy as np
 
+# pdfplumber internals behind page.crop(bbox).extract_text(), used to lay
+# out grid cells without cropping the page once per cell. Not public API:
+# without them each cell is cropped as before
+try:
+    from pdfplumber.page import test_proposed_bbox
+    from pdfplumber.utils import chars_to_textmap, clip_obj
+    HAS_TEXTMAP = True
+except ImportError:
+    test_proposed_bbox = chars_to_textmap = clip_obj = None
+    HAS_TEXTMAP = False
+
+try:
+    from .page_pool import map_page_blocks, pool_workers
+except ImportError:
+    # Run as a script from core/
+    from page_pool import map_page_blocks, pool_workers
+
+# Optional: faster JSON export
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+try:
+    import pymupdf as fitz
+    HAS_PYMUPDF = True
+except ImportError:
+    fitz = None
+    HAS_PYMUPDF = False
+    print("[WARN] PyMuPDF not available, using pdfplumber table detection only")
+
+
 
 class AdvancedTableExtractor:
     """Extract tables from CAD PDFs with multiple methods"""
     
-    def __init__(self, pdf_path):
+    def __init__(self, pdf_path, fast=False):
         self.pdf_path = pdf_path
+        # fast: skip methods 2-4 on pages where pdfplumber already found a table
+        self.fast = fast
         self.tables = []
+        self._seen_hashes = set()  # fingerprints of pdfplumber-method tables
+        self._pages_done = set()  # pages with a high-confidence pdfplumber table
+        self._boxes_for = None  # page.chars list the cached char boxes belong to
+        self._boxes = None
         self.results = {
             'source_file': str(pdf_path),
             'extraction_date': datetime.now().isoformat(),
@@ -38,6 +82,19 @@ class AdvancedTableExtractor:
             'statistics': {}
         }
     
+    def extract_tables_pymupdf(self):
+        """Extract tables using PyMuPDF's ruling-line table finder"""
+        print("\n[METHOD 0] Using PyMuPDF table detection...")
+        
+        if not HAS_PYMUPDF:
+            print("  [SKIP] PyMuPDF not installed")
+            return
+        
+        with fitz.open(self.pdf_path) as doc:
+            for page_num, page in enumerate(doc, 1):
+                print("  Scanning page {}...".format(page_num))
+                self.tables.extend(self._pymupdf_on_page(page, page_num))
+    
     def extract_tables_pdfplumber(self):
         """Extract tables using pdfplumber (best for structured tables)"""
         print("\n[METHOD 1] Using pdfplumber table detection...")
@@ -45,59 +102,7 @@ class AdvancedTableExtractor:
         with pdfplumber.open(self.pdf_path) as pdf:
             for page_num, page in enumerate(pdf.pages, 1):
                 print("  Scanning page {}...".format(page_num))
-                
-                # Method 1a: Built-in table detection
-                try:
-                    tables = page.extract_tables()
-                    if tables:
-                        for table_idx, table in enumerate(tables):
-                            table_data = {
-                                'page': page_num,
-                                'method': 'pdfplumber_native',
-                                'table_index': table_idx,
-                                'rows': len(table),
-                                'cols': len(table[0]) if table else 0,
-                                'data': table,
-                                'confidence': 'high'
-                            }
-                            self.tables.append(table_data)
-                            print("    [OK] Found table: {}x{} ({}x{} cells)".format(
-                                len(table), 
-                                len(table[0]) if table else 0,
-                                len(table) * (len(table[0]) if table else 0),
-                                table_idx + 1
-                            ))
-                except Exception as e:
-                    print("    [SKIP] pdfplumber native: {}".format(str(e)[:50]))
-                
-                # Method 1b: Using table_settings for better edge detection
-                try:
-                    table_settings = {
-                        "vertical_strategy": "lines",
-                        "horizontal_strategy": "lines",
-                        "explicit_vertical_lines": page.vertical_edges,
-                        "explicit_horizontal_lines": page.horizontal_edges
-                    }
-                    tables = page.extract_tables(table_settings)
-                    if tables:
-                        for table_idx, table in enumerate(tables):
-                            # Check if not duplicate
-                            if not self._is_duplicate_table(table):
-                                table_data = {
-                                    'page': page_num,
-                                    'method': 'pdfplumber_lines',
-                                    'table_index': table_idx,
-                                    'rows': len(table),
-                                    'cols': len(table[0]) if table else 0,
-                                    'data': table,
-                                    'confidence': 'high'
-                                }
-                                self.tables.append(table_data)
-                                print("    [OK] Found table (lines method): {}x{}".format(
-                                    len(table), len(table[0]) if table else 0
-                                ))
-                except Exception as e:
-                    print("    [SKIP] pdfplumber lines: {}".format(str(e)[:50]))
+                self.tables.extend(self._plumber_on_page(page, page_num))
     
     def extract_tables_geometry(self):
         """Extract tables using geometric analysis (rectangles and lines)"""
@@ -105,42 +110,10 @@ class AdvancedTableExtractor:
         
         with pdfplumber.open(self.pdf_path) as pdf:
             for page_num, page in enumerate(pdf.pages, 1):
+                if self.fast and page_num in self._pages_done:
+                    continue
                 print("  Analyzing geometry on page {}...".format(page_num))
-                
-                try:
-                    # Get all rectangles (table boundaries)
-                    rects = page.rects
-                    lines = page.lines
-                    
-                    if rects:
-                        print("    [OK] Found {} rectangles".format(len(rects)))
-                    
-                    if lines:
-                        print("    [OK] Found {} lines (potential table grid)".format(len(lines)))
-                    
-                    # Detect table regions by clustering rectangles
-                    table_regions = self._cluster_rectangles(rects)
-                    
-                    for region_idx, region in enumerate(table_regions):
-                        print("    [OK] Detected table region {}".format(region_idx + 1))
-                        
-                        # Extract text in this region
-                        cropped = page.crop(region)
-                        text_data = cropped.extract_text()
-                        
-                        if text_data:
-                            table_data = {
-                                'page': page_num,
-                                'method': 'geometric_clustering',
-                                'region_index': region_idx,
-                                'bbox': region,
-                                'raw_text': text_data,
-                                'confidence': 'medium'
-                            }
-                            self.tables.append(table_data)
-                
-                except Exception as e:
-                    print("    [SKIP] Geometric analysis: {}".format(str(e)[:50]))
+                self.tables.extend(self._geometry_on_page(page, page_num))
     
     def extract_tables_grid(self):
         """Extract tables by detecting grid patterns"""
@@ -148,37 +121,10 @@ class AdvancedTableExtractor:
         
         with pdfplumber.open(self.pdf_path) as pdf:
             for page_num, page in enumerate(pdf.pages, 1):
+                if self.fast and page_num in self._pages_done:
+                    continue
                 print("  Detecting grid patterns on page {}...".format(page_num))
-                
-                try:
-                    # Get horizontal and vertical lines
-                    h_edges = page.horizontal_edges
-                    v_edges = page.vertical_edges
-                    
-                    if h_edges and v_edges:
-                        print("    [OK] Detected grid: {} horizontal, {} vertical lines".format(
-                            len(h_edges), len(v_edges)
-                        ))
-                        
-                        # Create grid table
-                        grid_table = self._construct_grid_table(page, h_edges, v_edges)
-                        
-                        if grid_table and len(grid_table) > 0:
-                            table_data = {
-                                'page': page_num,
-                                'method': 'grid_detection',
-                                'rows': len(grid_table),
-                                'cols': len(grid_table[0]) if grid_table else 0,
-                                'data': grid_table,
-                                'confidence': 'high'
-                            }
-                            self.tables.append(table_data)
-                            print("    [OK] Extracted grid table: {}x{}".format(
-                                len(grid_table), len(grid_table[0]) if grid_table else 0
-                            ))
-                
-                except Exception as e:
-                    print("    [SKIP] Grid detection: {}".format(str(e)[:50]))
+                self.tables.extend(self._grid_on_page(page, page_num))
     
     def extract_text_blocks_as_table(self):
         """Extract text blocks and organize as table"""
@@ -186,181 +132,423 @@ class AdvancedTableExtractor:
         
         with pdfplumber.open(self.pdf_path) as pdf:
             for page_num, page in enumerate(pdf.pages, 1):
+                if self.fast and page_num in self._pages_done:
+                    continue
                 print("  Processing text blocks on page {}...".format(page_num))
+                self.tables.extend(self._text_blocks_on_page(page, page_num))
+    
+    def _pymupdf_on_page(self, page, page_num):
+        """PyMuPDF table detection on one fitz page"""
+        found = []
+        
+        try:
+            for table_idx, tab in enumerate(page.find_tables(strategy="lines_strict")):
+                table = tab.extract()
+                table_data = {
+                    'page': page_num,
+                    'method': 'pymupdf',
+                    'table_index': table_idx,
+                    'rows': len(table),
+                    'cols': len(table[0]) if table else 0,
+                    'data': table,
+                    'confidence': 'high'
+                }
+                found.append(table_data)
+                print("    [OK] Found table (PyMuPDF): {}x{}".format(
+                    len(table), len(table[0]) if table else 0
+                ))
+        except Exception as e:
+            print("    [SKIP] PyMuPDF tables: {}".format(str(e)[:50]))
+        
+        return found
+    
+    def _plumber_on_page(self, page, page_num):
+        """Method 1 on one page"""
+        found = []
+        
+        # Method 1a: Built-in table detection
+        try:
+            tables = page.extract_tables()
+            if tables:
+                for table_idx, table in enumerate(tables):
+                    table_data = {
+                        'page': page_num,
+                        'method': 'pdfplumber_native',
+                        'table_index': table_idx,
+                        'rows': len(table),
+                        'cols': len(table[0]) if table else 0,
+                        'data': table,
+                        'confidence': 'high'
+                    }
+                    found.append(table_data)
+                    self._seen_hashes.add(self._fingerprint(table))
+                    print("    [OK] Found table: {}x{} ({}x{} cells)".format(
+                        len(table), 
+                        len(table[0]) if table else 0,
+                        len(table) * (len(table[0]) if table else 0),
+                        table_idx + 1
+                    ))
+        except Exception as e:
+            print("    [SKIP] pdfplumber native: {}".format(str(e)[:50]))
+        
+        # Method 1b: Using table_settings for better edge detection
+        try:
+            table_settings = {
+                "vertical_strategy": "lines",
+                "horizontal_strategy": "lines",
+                "explicit_vertical_lines": page.vertical_edges,
+                "explicit_horizontal_lines": page.horizontal_edges
+            }
+            tables = page.extract_tables(table_settings)
+            if tables:
+                for table_idx, table in enumerate(tables):
+                    # Check if not duplicate
+                    if not self._is_duplicate_table(table):
+                        table_data = {
+                            'page': page_num,
+                            'method': 'pdfplumber_lines',
+                            'table_index': table_idx,
+                            'rows': len(table),
+                            'cols': len(table[0]) if table else 0,
+                            'data': table,
+                            'confidence': 'high'
+                        }
+                        found.append(table_data)
+                        self._seen_hashes.add(self._fingerprint(table))
+                        print("    [OK] Found table (lines method): {}x{}".format(
+                            len(table), len(table[0]) if table else 0
+                        ))
+        except Exception as e:
+            print("    [SKIP] pdfplumber lines: {}".format(str(e)[:50]))
+        
+        if found:
+            self._pages_done.add(page_num)
+        return found
+    
+    def _geometry_on_page(self, page, page_num):
+        """Method 2 on one page"""
+        found = []
+        
+        try:
+            # Get all rectangles (table boundaries)
+            rects = page.rects
+            lines = page.lines
+            
+            if rects:
+                print("    [OK] Found {} rectangles".format(len(rects)))
+            
+            if lines:
+                print("    [OK] Found {} lines (potential table grid)".format(len(lines)))
+            
+            # Detect table regions by clustering rectangles
+            table_regions = self._cluster_rectangles(rects)
+            
+            for region_idx, region in enumerate(table_regions):
+                print("    [OK] Detected table region {}".format(region_idx + 1))
                 
-                try:
-                    # Get all text with coordinates
-                    chars = page.chars
-                    
-                    if chars:
-                        print("    [OK] Found {} characters with coordinates".format(len(chars)))
-                        
-                        # Group into lines and columns
-                        organized = self._organize_chars_into_table(chars)
-                        
-                        if organized:
-                            table_data = {
-                                'page': page_num,
-                                'method': 'text_block_organization',
-                                'rows': len(organized),
-                                'cols': len(organized[0]) if organized else 0,
-                                'data': organized,
-                                'confidence': 'medium'
-                            }
-                            self.tables.append(table_data)
-                            print("    [OK] Organized into table: {}x{}".format(
-                                len(organized), len(organized[0]) if organized else 0
-                            ))
+                # Extract text in this region
+                cropped = page.crop(region)
+                text_data = cropped.extract_text()
                 
-                except Exception as e:
-                    print("    [SKIP] Text block organization: {}".format(str(e)[:50]))
+                if text_data:
+                    table_data = {
+                        'page': page_num,
+                        'method': 'geometric_clustering',
+                        'region_index': region_idx,
+                        'bbox': region,
+                        'raw_text': text_data,
+                        'confidence': 'medium'
+                    }
+                    found.append(table_data)
+        
+        except Exception as e:
+            print("    [SKIP] Geometric analysis: {}".format(str(e)[:50]))
+        
+        return found
+    
+    def _grid_on_page(self, page, page_num):
+        """Method 3 on one page"""
+        found = []
+        
+        try:
+            # Get horizontal and vertical lines
+            h_edges = page.horizontal_edges
+            v_edges = page.vertical_edges
+            
+            if h_edges and v_edges:
+                print("    [OK] Detected grid: {} horizontal, {} vertical lines".format(
+                    len(h_edges), len(v_edges)
+                ))
+                
+                # Create grid table
+                grid_table = self._construct_grid_table(page, h_edges, v_edges)
+                
+                if grid_table and len(grid_table) > 0:
+                    table_data = {
+                        'page': page_num,
+                        'method': 'grid_detection',
+                        'rows': len(grid_table),
+                        'cols': len(grid_table[0]) if grid_table else 0,
+                        'data': grid_table,
+                        'confidence': 'high'
+                    }
+                    found.append(table_data)
+                    print("    [OK] Extracted grid table: {}x{}".format(
+                        len(grid_table), len(grid_table[0]) if grid_table else 0
+                    ))
+        
+        except Exception as e:
+            print("    [SKIP] Grid detection: {}".format(str(e)[:50]))
+        
+        return found
+    
+    def _text_blocks_on_page(self, page, page_num):
+        """Method 4 on one page"""
+        found = []
+        
+        try:
+            # Get all text with coordinates
+            chars = page.chars
+            
+            if chars:
+                print("    [OK] Found {} characters with coordinates".format(len(chars)))
+                
+                # Group into lines and columns
+                organized = self._organize_chars_into_table(chars)
+                
+                if organized:
+                    table_data = {
+                        'page': page_num,
+                        'method': 'text_block_organization',
+                        'rows': len(organized),
+                        'cols': len(organized[0]) if organized else 0,
+                        'data': organized,
+                        'confidence': 'medium'
+                    }
+                    found.append(table_data)
+                    print("    [OK] Organized into table: {}x{}".format(
+                        len(organized), len(organized[0]) if organized else 0
+                    ))
+        
+        except Exception as e:
+            print("    [SKIP] Text block organization: {}".format(str(e)[:50]))
+        
+        return found
+    
+    def _char_boxes(self, chars):
+        """(n, 4) array of the chars' (x0, top, x1, bottom), built once per page"""
+        if chars is not self._boxes_for:
+            self._boxes_for = chars
+            self._boxes = np.array(
+                [(c['x0'], c['top'], c['x1'], c['bottom']) for c in chars], dtype=float
+            ).reshape(-1, 4)
+        return self._boxes
+    
+    def _fingerprint(self, data):
+        """Stable hash of a table's data for duplicate checks"""
+        return hashlib.blake2b(repr(data).encode(), digest_size=16).digest()
     
     def _is_duplicate_table(self, table):
         """Check if table is already in extracted tables"""
-        for existing in self.tables:
-            if existing.get('data') == table:
-                return True
-        return False
+        return self._fingerprint(table) in self._seen_hashes
     
     def _cluster_rectangles(self, rects, threshold=50):
         """Cluster rectangles to identify table regions"""
         if not rects:
             return []
         
+        # (x0, top, x1, bottom) per rectangle
+        boxes = np.array([(r['x0'], r['top'], r['x1'], r['bottom']) for r in rects], dtype=float)
+        unused = np.ones(len(boxes), dtype=bool)
         clusters = []
-        used = set()
         
-        for i, rect in enumerate(rects):
-            if i in used:
+        # "Close" means any one edge within threshold of the same edge, so
+        # index each edge coordinate separately and answer it with range
+        # lookups instead of comparing against every rectangle
+        order = np.argsort(boxes, axis=0, kind='stable')
+        coords = np.take_along_axis(boxes, order, axis=0)
+        
+        for i in range(len(boxes)):
+            if not unused[i]:
                 continue
             
-            cluster = [rect]
-            used.add(i)
-            
-            for j, other in enumerate(rects[i+1:], i+1):
-                if j in used:
-                    continue
-                
-                # Check if rectangles are close
-                if self._rects_close(rect, other, threshold):
-                    cluster.append(other)
-                    used.add(j)
+            # Every remaining rectangle with any edge within threshold of the
+            # same edge of rectangle i joins its cluster (i itself included)
+            candidates = []
+            for k in range(4):
+                lo = np.searchsorted(coords[:, k], boxes[i, k] - threshold, side='right')
+                hi = np.searchsorted(coords[:, k], boxes[i, k] + threshold, side='left')
+                candidates.append(order[lo:hi, k])
+            candidates = np.concatenate(candidates)
+            members = np.unique(candidates[unused[candidates]])
+            unused[members] = False
             
-            if len(cluster) > 1:
+            if len(members) > 1:
                 # Get bounding box
-                x0 = min(r[0] for r in cluster)
-                y0 = min(r[1] for r in cluster)
-                x1 = max(r[2] for r in cluster)
-                y1 = max(r[3] for r in cluster)
-                clusters.append((x0, y0, x1, y1))
+                cluster = boxes[members]
+                x0, y0 = cluster[:, :2].min(axis=0)
+                x1, y1 = cluster[:, 2:].max(axis=0)
+                clusters.append((float(x0), float(y0), float(x1), float(y1)))
         
         return clusters
     
-    def _rects_close(self, r1, r2, threshold=50):
-        """Check if two rectangles are close to each other"""
-        return (abs(r1[0] - r2[0]) < threshold or 
-                abs(r1[2] - r2[2]) < threshold or
-                abs(r1[1] - r2[1]) < threshold or
-                abs(r1[3] - r2[3]) < threshold)
-    
     def _construct_grid_table(self, page, h_edges, v_edges):
         """Construct table from grid edges"""
         if not h_edges or not v_edges:
             return []
         
-        # Sort edges
-        h_coords = sorted(set(int(e['top']) for e in h_edges))
-        v_coords = sorted(set(int(e['x0']) for e in v_edges))
+        # Sorted distinct edge positions (truncated to whole points)
+        h_coords = np.unique(np.fromiter((e['top'] for e in h_edges), dtype=np.int64, count=len(h_edges))).tolist()
+        v_coords = np.unique(np.fromiter((e['x0'] for e in v_edges), dtype=np.int64, count=len(v_edges))).tolist()
         
-        # Create cells and extract text
-        table = []
+        n_rows, n_cols = len(h_coords) - 1, len(v_coords) - 1
+        if n_rows <= 0 or n_cols <= 0:
+            return []
         
-        for i in range(len(h_coords) - 1):
-            row = []
+        if not HAS_TEXTMAP:
+            return self._crop_grid_table(page, h_coords, v_coords)
+        
+        # Hand each char to every cell it touches, clipped the way
+        # page.crop(cell) clips it, so the page's chars are scanned once
+        # rather than once per cell
+        cell_chars = defaultdict(list)
+        chars = page.chars
+        boxes = self._char_boxes(chars)
+        h_array, v_array = np.array(h_coords), np.array(v_coords)
+        # First and last row/column each char touches
+        row0 = np.maximum(np.searchsorted(h_array, boxes[:, 1], side='left') - 1, 0)
+        row1 = np.minimum(np.searchsorted(h_array, boxes[:, 3], side='right') - 1, n_rows - 1)
+        col0 = np.maximum(np.searchsorted(v_array, boxes[:, 0], side='left') - 1, 0)
+        col1 = np.minimum(np.searchsorted(v_array, boxes[:, 2], side='right') - 1, n_cols - 1)
+        
+        for char, r0, r1, c0, c1 in zip(chars, row0.tolist(), row1.tolist(),
+                                       col0.tolist(), col1.tolist()):
+            for i in range(r0, r1 + 1):
+                for j in range(c0, c1 + 1):
+                    cell_bbox = (v_coords[j], h_coords[i], v_coords[j + 1], h_coords[i + 1])
+                    clipped = clip_obj(char, cell_bbox)
+                    if clipped is not None:
+                        cell_chars[i, j].append(clipped)
+        
+        # Allocate every cell empty up front, then fill in only the cells
+        # that received chars; large CAD grids are mostly empty
+        table = [[""] * n_cols for _ in range(n_rows)]
+        
+        for (i, j), cell in cell_chars.items():
+            x0, x1 = v_coords[j], v_coords[j + 1]
             y0, y1 = h_coords[i], h_coords[i + 1]
             
-            for j in range(len(v_coords) - 1):
-                x0, x1 = v_coords[j], v_coords[j + 1]
-                
-                # Crop to cell
-                cell_bbox = (x0, y0, x1, y1)
+            # Same text layout as page.crop(cell_bbox).extract_text()
+            cell_bbox = (x0, y0, x1, y1)
+            try:
+                test_proposed_bbox(cell_bbox, page.bbox)
+                table[i][j] = chars_to_textmap(
+                    cell, layout_bbox=cell_bbox, layout_width=x1 - x0, layout_height=y1 - y0
+                ).as_string.strip()
+            except Exception:
+                pass
+        
+        return table
+    
+    @staticmethod
+    def _crop_grid_table(page, h_coords, v_coords):
+        """_construct_grid_table without pdfplumber internals: crop each cell"""
+        table = []
+        for y0, y1 in zip(h_coords, h_coords[1:]):
+            row = []
+            for x0, x1 in zip(v_coords, v_coords[1:]):
                 try:
-                    cropped = page.crop(cell_bbox)
-                    cell_text = cropped.extract_text() or ""
-                    row.append(cell_text.strip())
-                except:
+                    row.append((page.crop((x0, y0, x1, y1)).extract_text() or "").strip())
+                except Exception:
                     row.append("")
-            
-            if row:
-                table.append(row)
-        
-        return table if table else []
+            table.append(row)
+        return table
     
-    def _organize_chars_into_table(self, chars):
+    def _organize_chars_into_table(self, chars, gap=20):
         """Organize character objects into table structure"""
         if not chars:
             return []
         
-        # Group by y-coordinate (rows)
-        rows_dict = defaultdict(list)
+        n = len(chars)
+        boxes = self._char_boxes(chars)
+        x0, top, x1 = boxes[:, 0], boxes[:, 1], boxes[:, 2]
         
-        for char in chars:
-            y = int(char['top'] / 10) * 10  # Round to nearest 10 points
-            rows_dict[y].append(char)
+        # Group by y-coordinate (rows): round down to 10 points
+        row_y = np.trunc(top / 10) * 10
         
-        # Sort rows by y-coordinate
-        sorted_rows = sorted(rows_dict.items())
+        # Sort by row, then by x-coordinate within the row; lexsort is
+        # stable, so chars at the same x keep their page order
+        order = np.lexsort((x0, row_y))
+        row_y, x0, x1 = row_y[order], x0[order], x1[order]
         
-        table = []
+        # A new row starts where the row changes, a new column where the gap
+        # from the previous char in the row is at least gap points
+        new_row = np.ones(n, dtype=bool)
+        new_row[1:] = row_y[1:] != row_y[:-1]
+        new_col = new_row.copy()
+        new_col[1:] |= ~(x0[1:] - x1[:-1] < gap)
         
-        for y_coord, row_chars in sorted_rows:
-            # Sort chars in row by x-coordinate
-            sorted_chars = sorted(row_chars, key=lambda c: c['x0'])
-            
-            # Group into columns
-            columns = self._group_chars_into_columns(sorted_chars)
-            
-            # Extract text from each column
-            row_text = []
-            for col_chars in columns:
-                col_text = ''.join(c['text'] for c in col_chars).strip()
-                row_text.append(col_text)
-            
-            if row_text:
+        # Read the texts in page order, then reorder (cheaper than random
+        # access into the char dicts)
+        texts = [c['text'] for c in chars]
+        texts = [texts[i] for i in order.tolist()]
+        starts = np.flatnonzero(new_col).tolist()
+        
+        table = []
+        for start, end, starts_row in zip(starts, starts[1:] + [n], new_row[starts].tolist()):
+            if starts_row:
+                row_text = []
                 table.append(row_text)
+            row_text.append(''.join(texts[start:end]).strip())
         
         return table
     
-    def _group_chars_into_columns(self, chars, gap=20):
-        """Group characters into columns based on x-coordinate gaps"""
-        if not chars:
-            return []
-        
-        columns = [[chars[0]]]
-        
-        for char in chars[1:]:
-            # Check gap from last char in last column
-            last_char = columns[-1][-1]
-            gap_size = char['x0'] - last_char['x1']
-            
-            if gap_size < gap:
-                columns[-1].append(char)
-            else:
-                columns.append([char])
-        
-        return columns
-    
-    def extract_all(self):
-        """Run all extraction methods"""
+    def extract_all(self, workers=None, page_timeout=0):
+        """
+        Run all extraction methods
+        
+        Each page is tried with PyMuPDF first; the pdfplumber methods only
+        run on pages where it finds no table. With page_timeout > 0, a page
+        that takes longer than that many seconds is skipped and listed in
+        statistics['timed_out_pages']. The timeout uses SIGALRM, so it is
+        off by default and only applies on POSIX in the main thread. Pages are scanned in-process
+        unless the PDF is long enough for a process pool to pay off (see
+        page_pool.pool_workers); pass workers to force a pool size. Results
+        are kept per method so the final order (and so deduplication) is the
+        same as running the methods one after another.
+        """
         print("\n" + "="*70)
         print("ADVANCED TABLE EXTRACTION - MULTIPLE METHODS")
         print("="*70)
         print("\nFile: {}".format(self.pdf_path))
         
-        self.extract_tables_pdfplumber()
-        self.extract_tables_geometry()
-        self.extract_tables_grid()
-        self.extract_text_blocks_as_table()
+        with pdfplumber.open(self.pdf_path) as pdf:
+            page_count = len(pdf.pages)
+        
+        page_nums = range(1, page_count + 1)
+        workers = pool_workers(page_count, workers)
+        page_results = map_page_blocks(_scan_page_block, self.pdf_path, page_nums, workers,
+                                       self.fast, page_timeout)
+        
+        plumber, geometry, grid, text_blocks = [], [], [], []
+        timed_out_pages = []
+        for page_tables in page_results:
+            # Workers only see their own block, so repeat the lines-method
+            # duplicate check against every earlier page
+            for table_data in page_tables[0]:
+                if table_data['method'] == 'timeout':
+                    # Not a table: keep it out of the tables, counts and exports
+                    timed_out_pages.append(table_data['page'])
+                    continue
+                key = self._fingerprint(table_data['data'])
+                if table_data['method'] == 'pdfplumber_lines' and key in self._seen_hashes:
+                    continue
+                self._seen_hashes.add(key)
+                plumber.append(table_data)
+            geometry.extend(page_tables[1])
+            grid.extend(page_tables[2])
+            text_blocks.extend(page_tables[3])
+        self.tables.extend(plumber + geometry + grid + text_blocks)
         
         # Deduplicate similar tables
         self._deduplicate_tables()
@@ -369,21 +557,31 @@ class AdvancedTableExtractor:
         self.results['statistics'] = {
             'total_tables_found': len(self.tables),
             'by_method': self._count_by_method(),
-            'by_page': self._count_by_page()
+            'by_page': self._count_by_page(),
+            'timed_out_pages': timed_out_pages
         }
         
         return self.results
     
     def _deduplicate_tables(self):
-        """Remove duplicate tables"""
+        """
+        Remove duplicate tables
+        
+        Tables with a 'data' grid are compared by content. Geometric
+        clustering regions carry only raw text, so they are compared by page
+        and bbox; keying them on the missing data would keep only the first.
+        """
         unique_tables = []
-        seen = []
+        seen = set()
         
         for table in self.tables:
-            data_str = str(table.get('data', ''))
-            if data_str not in seen:
+            if 'data' in table:
+                key = self._fingerprint(table['data'])
+            else:
+                key = self._fingerprint((table.get('page'), table.get('bbox')))
+            if key not in seen:
                 unique_tables.append(table)
-                seen.append(data_str)
+                seen.add(key)
         
         self.tables = unique_tables
     
@@ -404,6 +602,96 @@ class AdvancedTableExtractor:
         return dict(counts)
 
 
+class _PageTimeout(BaseException):
+    """Raised by SIGALRM when a page runs past its page_timeout
+    
+    Not an Exception, so the per-method error handlers let it through.
+    """
+
+
+def _raise_page_timeout(signum, frame):
+    raise _PageTimeout()
+
+
+def _scan_page_block(pdf_path, page_nums, fast=False, page_timeout=0):
+    """Worker for AdvancedTableExtractor.extract_all: per-page (plumber, geometry, grid, text_blocks) tables"""
+    extractor = AdvancedTableExtractor(pdf_path, fast=fast)
+    results = []
+    doc = fitz.open(pdf_path) if HAS_PYMUPDF else None
+    
+    # Opt-in: bound pathological pages with an alarm. Signals can only be
+    # handled in the main thread, so scans from other threads run unbounded
+    use_alarm = (page_timeout > 0 and hasattr(signal, 'SIGALRM')
+                 and threading.current_thread() is threading.main_thread())
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_page_timeout)
+    
+    try:
+        # Open and parse each page once and run every method on it
+        with pdfplumber.open(pdf_path, pages=page_nums) as pdf:
+            for page in pdf.pages:
+                page_num = page.page_number
+                print("\n  Page {}...".format(page_num))
+                if use_alarm:
+                    signal.alarm(page_timeout)
+                try:
+                    results.append(_scan_page(extractor, doc, page, page_num))
+                except _PageTimeout:
+                    print("    [WARN] Page {} took over {}s, skipped".format(page_num, page_timeout))
+                    # Marker only; extract_all moves it to statistics
+                    results.append(([{'page': page_num, 'method': 'timeout'}], [], [], []))
+                finally:
+                    if use_alarm:
+                        signal.alarm(0)
+                    # Free the page's parsed objects before the next one
+                    page.close()
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous_handler)
+        if doc is not None:
+            doc.close()
+    
+    return results
+
+
+def _scan_page(extractor, doc, page, page_num):
+    """Run the extraction methods on one page: (plumber, geometry, grid, text_blocks)"""
+    if doc is not None:
+        # PyMuPDF finds ruled tables without a pdfminer parse
+        tables = extractor._pymupdf_on_page(doc[page_num - 1], page_num)
+        if tables:
+            return (tables, [], [], [])
+    
+    # Parse the page up front; rects, lines and edges reuse it
+    page.objects
+    plumber = extractor._plumber_on_page(page, page_num)
+    if extractor.fast and page_num in extractor._pages_done:
+        return (plumber, [], [], [])
+    return (
+        plumber,
+        extractor._geometry_on_page(page, page_num),
+        extractor._grid_on_page(page, page_num),
+        extractor._text_blocks_on_page(page, page_num)
+    )
+
+
+def _dumps_indented(obj):
+    """obj as UTF-8 JSON with 2-space indent (orjson when available)"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def _padded_rows(data):
+    """Rows padded with empty cells to the widest row, as a DataFrame would lay them out"""
+    widths = set(map(len, data))
+    if len(widths) <= 1:
+        # Already rectangular: hand the rows over as they are
+        return data
+    width = max(widths)
+    return [list(row) + [None] * (width - len(row)) for row in data]
+
+
 class TableExporter:
     """Export extracted tables in multiple formats"""
     
@@ -419,7 +707,6 @@ class TableExporter:
             
             try:
                 data = table_info['data']
-                df = pd.DataFrame(data)
                 
                 filename = "table_{:02d}_{}_{}.csv".format(
                     idx + 1,
@@ -428,7 +715,9 @@ class TableExporter:
                 )
                 filepath = Path(output_dir) / filename
                 
-                df.to_csv(filepath, index=False, header=False, encoding='utf-8')
+                with open(filepath, 'w', newline='', encoding='utf-8', buffering=1024 * 1024) as f:
+                    writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+                    writer.writerows(_padded_rows(data))
                 print("  [OK] {}".format(filename))
                 files.append(str(filepath))
             
@@ -443,17 +732,24 @@ class TableExporter:
         print("\n[EXPORT] Saving as Excel...")
         
         try:
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                for idx, table_info in enumerate(tables):
-                    if 'data' not in table_info:
-                        continue
-                    
-                    data = table_info['data']
-                    df = pd.DataFrame(data)
-                    
-                    sheet_name = "Table_{}".format(idx + 1)
-                    df.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
-                    print("  [OK] Sheet: {}".format(sheet_name))
+            from openpyxl import Workbook
+            
+            # Write-only mode streams rows to the file instead of keeping
+            # every cell object in memory
+            workbook = Workbook(write_only=True)
+            for idx, table_info in enumerate(tables):
+                if 'data' not in table_info:
+                    continue
+                
+                sheet_name = "Table_{}".format(idx + 1)
+                sheet = workbook.create_sheet(sheet_name)
+                for row in table_info['data']:
+                    sheet.append(row)
+                print("  [OK] Sheet: {}".format(sheet_name))
+            
+            if not workbook.worksheets:
+                raise ValueError("No tables with data to export")
+            workbook.save(output_file)
             
             print("  [OK] Saved to: {}".format(output_file))
             return output_file
@@ -468,25 +764,35 @@ class TableExporter:
         print("\n[EXPORT] Saving as JSON...")
         
         try:
-            # Convert to serializable format
-            export_data = {
+            # Written one table at a time; the output is the same as an
+            # indent=2 dump of the whole export
+            header = {
                 'source_file': results['source_file'],
                 'extraction_date': results['extraction_date'],
-                'statistics': results['statistics'],
-                'tables': [
-                    {
+                'statistics': results['statistics']
+            }
+            
+            with open(output_file, 'wb') as f:
+                f.write(b'{')
+                for key, value in header.items():
+                    f.write(b'\n  ' + _dumps_indented(key) + b': ')
+                    # Nest one level: string values never contain a raw newline
+                    f.write(_dumps_indented(value).replace(b'\n', b'\n  ') + b',')
+                
+                f.write(b'\n  "tables": [')
+                separator = b'\n    '
+                for t in results['tables']:
+                    entry = {
                         'page': t.get('page'),
                         'method': t.get('method'),
                         'rows': t.get('rows', len(t.get('data', []))),
                         'cols': t.get('cols', len(t.get('data', [[]])[0]) if t.get('data') else 0),
                         'data': t.get('data')
                     }
-                    for t in results['tables']
-                ]
-            }
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=2, ensure_ascii=False)
+                    f.write(separator)
+                    f.write(_dumps_indented(entry).replace(b'\n', b'\n    '))
+                    separator = b',\n    '
+                f.write(b'\n  ]\n}' if results['tables'] else b']\n}')
             
             print("  [OK] Saved to: {}".format(output_file))
             return output_file
@@ -521,8 +827,10 @@ class TableExporter:
                         f.write("|" + "|".join(["---"] * len(data[0])) + "|\n")
                         
                         # Write rows
-                        for row in data[1:]:
-                            f.write("| " + " | ".join(str(cell) for cell in row) + " |\n")
+                        f.writelines(
+                            "| " + " | ".join(str(cell) for cell in row) + " |\n"
+                            for row in data[1:]
+                        )
                     
                     f.write("\n")
             
@@ -539,7 +847,8 @@ class TableExporter:
         print("\n[EXPORT] Saving as HTML...")
         
         try:
-            html_content = """<html>
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write("""<html>
 <head>
     <meta charset="UTF-8">
     <title>Extracted Tables</title>
@@ -553,35 +862,32 @@ class TableExporter:
 </head>
 <body>
     <h1>Extracted Tables from PDF</h1>
-"""
-            
-            for idx, table_info in enumerate(tables):
-                if 'data' not in table_info:
-                    continue
-                
-                html_content += '<h2>Table {} (Page {}, Method: {})</h2>\n'.format(
-                    idx + 1,
-                    table_info.get('page', '?'),
-                    table_info.get('method', 'unknown')
-                )
+""")
                 
-                data = table_info['data']
-                if data:
-                    html_content += '<table>\n'
+                for idx, table_info in enumerate(tables):
+                    if 'data' not in table_info:
+                        continue
                     
-                    for row in data:
-                        html_content += '  <tr>\n'
-                        for cell in row:
-                            html_content += '    <td>{}</td>\n'.format(str(cell))
-                        html_content += '  </tr>\n'
+                    f.write('<h2>Table {} (Page {}, Method: {})</h2>\n'.format(
+                        idx + 1,
+                        escape(str(table_info.get('page', '?'))),
+                        escape(str(table_info.get('method', 'unknown')))
+                    ))
                     
-                    html_content += '</table>\n'
-            
-            html_content += """</body>
-</html>"""
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+                    data = table_info['data']
+                    if data:
+                        f.write('<table>\n')
+                        
+                        # Cell text is escaped: CAD labels often contain <, > and &
+                        for row in data:
+                            f.write('  <tr>\n' + ''.join(
+                                '    <td>' + escape(str(cell)) + '</td>\n' for cell in row
+                            ) + '  </tr>\n')
+                        
+                        f.write('</table>\n')
+                
+                f.write("""</body>
+</html>""")
             
             print("  [OK] Saved to: {}".format(output_file))
             return output_file
@@ -591,27 +897,38 @@ class TableExporter:
             return None
 
 
+# Export format name -> exporter taking the extract_all results ("all" runs each in order)
+EXPORT_FORMATS = {
+    'csv': lambda results: TableExporter.to_csv(results['tables']),
+    'excel': lambda results: TableExporter.to_excel(results['tables']),
+    'json': TableExporter.to_json,
+    'markdown': lambda results: TableExporter.to_markdown(results['tables']),
+    'html': lambda results: TableExporter.to_html(results['tables']),
+}
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python table_extractor.py <pdf_file> [--format csv|excel|json|markdown|html|all]")
-        print("\nExample: python table_extractor.py H.pdf --format all")
-        sys.exit(1)
-    
-    pdf_path = sys.argv[1]
-    export_format = "all"
+    parser = argparse.ArgumentParser(
+        description="Extract tables from CAD PDFs",
+        epilog="Example: python table_extractor.py H.pdf --format all"
+    )
+    parser.add_argument('pdf_file')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS) + ['all'], default='all')
+    parser.add_argument('--fast', action='store_true',
+                        help="skip the fallback methods on pages where pdfplumber finds a table")
+    parser.add_argument('--page-timeout', type=int, default=0, metavar='SECONDS',
+                        help="skip pages that take longer than this (POSIX only; default: off)")
+    args = parser.parse_args()
     
-    if '--format' in sys.argv:
-        idx = sys.argv.index('--format')
-        if idx + 1 < len(sys.argv):
-            export_format = sys.argv[idx + 1]
+    pdf_path = args.pdf_file
     
     if not Path(pdf_path).exists():
         print("[ERROR] File not found: {}".format(pdf_path))
         sys.exit(1)
     
     # Extract tables
-    extractor = AdvancedTableExtractor(pdf_path)
-    results = extractor.extract_all()
+    extractor = AdvancedTableExtractor(pdf_path, fast=args.fast)
+    results = extractor.extract_all(page_timeout=args.page_timeout)
     
     # Print summary
     print("\n" + "="*70)
@@ -620,6 +937,8 @@ def main():
     print("Total tables found: {}".format(results['statistics']['total_tables_found']))
     print("By method: {}".format(results['statistics']['by_method']))
     print("By page: {}".format(results['statistics']['by_page']))
+    if results['statistics']['timed_out_pages']:
+        print("[WARN] Pages skipped after {}s: {}".format(args.page_timeout, results['statistics']['timed_out_pages']))
     
     # Display first table preview
     if results['tables']:
@@ -633,24 +952,12 @@ def main():
             print("... ({} more rows)".format(len(first_table) - 5))
     
     # Export
-    exporter = TableExporter()
-    
-    if export_format == "all":
-        exporter.to_csv(results['tables'])
-        exporter.to_excel(results['tables'])
-        exporter.to_json(results)
-        exporter.to_markdown(results['tables'])
-        exporter.to_html(results['tables'])
-    elif export_format == "csv":
-        exporter.to_csv(results['tables'])
-    elif export_format == "excel":
-        exporter.to_excel(results['tables'])
-    elif export_format == "json":
-        exporter.to_json(results)
-    elif export_format == "markdown":
-        exporter.to_markdown(results['tables'])
-    elif export_format == "html":
-        exporter.to_html(results['tables'])
+    if args.format == "all":
+        exporters = EXPORT_FORMATS.values()
+    else:
+        exporters = [EXPORT_FORMATS[args.format]]
+    for export in exporters:
+        export(results)
     
     print("\n" + "="*70)
     print("COMPLETE")
@@ -81,23 +81,18 @@ class VectorSymbolExtractor:
         items = drawing.get('items', [])
         num_segments = len(items)
         
-        # Extract path types
+        # Extract path types (only the first 5 are used)
         path_types = []
         for item in items:
             if isinstance(item, tuple) and len(item) > 0:
                 path_types.append(str(item[0]))
+                if len(path_types) == 5:
+                    break
         
         # Create signature from normalized properties
-        sig_parts = [
-            f"w{int(width*10)}",  # Normalize to 0.1mm precision
-            f"h{int(height*10)}",
-            f"a{int(area*100)}",
-            f"ar{int(aspect*100)}",
-            f"n{num_segments}",
-            f"t{''.join(path_types[:5])}"  # First 5 path types
-        ]
-        
-        return "_".join(sig_parts)
+        # (width/height normalized to 0.1mm precision)
+        return (f"w{int(width*10)}_h{int(height*10)}_a{int(area*100)}"
+                f"_ar{int(aspect*100)}_n{num_segments}_t{''.join(path_types)}")
     
     def normalize_position(self, drawing: Dict, page_width: float, page_height: float) -> Dict:
         """Normalize drawing position relative to page"""
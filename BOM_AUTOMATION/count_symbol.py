@@ -7,30 +7,66 @@ Usage: python count_symbol.py <pdf_path> <symbol_template.png>
 import sys
 import json
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
 try:
     import pymupdf as fitz
     import cv2
     import numpy as np
-    from PIL import Image
     HAS_DEPS = True
 except ImportError as e:
     print(f"[ERROR] Missing dependencies: {e}")
     HAS_DEPS = False
 
-def rasterize_pdf_page(pdf_path, page_num=0, dpi=300):
-    """Rasterize PDF page to image"""
-    doc = fitz.open(pdf_path)
+# With pyramid=True, templates at least this large (pixels) are matched
+# coarse-to-fine at half resolution first; coarse candidates are kept down
+# to match_thresh - margin. Approximate, so off by default
+PYRAMID_MIN_SIZE = 32
+PYRAMID_MARGIN = 0.1
+
+# With a coarse DPI, candidates are kept down to match_thresh - margin
+COARSE_MARGIN = 0.05
+
+def rasterize_pdf_page(pdf_path, page_num=0, dpi=300, doc=None):
+    """Rasterize PDF page to a grayscale image (reuses ``doc`` when one is already open)"""
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(pdf_path)
     page = doc[page_num]
     zoom = dpi / 72.0
     mat = fitz.Matrix(zoom, zoom)
-    pix = page.get_pixmap(matrix=mat, alpha=False)
+    # Matching only needs gray: render one channel instead of converting RGB
+    pix = page.get_pixmap(matrix=mat, alpha=False, colorspace=fitz.csGRAY)
     
-    mode = "RGB" if pix.n < 4 else "RGBA"
-    img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-    doc.close()
+    img = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width).copy()
+    if own_doc:
+        doc.close()
     
-    return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+    return img
+
+
+class PageCache:
+    """Rasterized pages of one PDF, kept preprocessed for matching"""
+    
+    def __init__(self, pdf_path):
+        self.pdf_path = str(pdf_path)
+        self.doc = fitz.open(pdf_path)
+        self.pages = {}
+    
+    def __len__(self):
+        return len(self.doc)
+    
+    def get(self, page_num, dpi=300):
+        """Return the preprocessed gray page, rendering it on first use"""
+        key = (page_num, dpi)
+        if key not in self.pages:
+            img = rasterize_pdf_page(self.pdf_path, page_num, dpi=dpi, doc=self.doc)
+            self.pages[key] = preprocess_for_matching(img)
+        return self.pages[key]
+    
+    def close(self):
+        self.pages.clear()
+        self.doc.close()
 
 def preprocess_for_matching(img):
     """Preprocess image for template matching"""
@@ -40,14 +76,60 @@ def preprocess_for_matching(img):
     gray = clahe.apply(gray)
     return gray
 
+def coarse_to_fine_match(img_gray, img_small, tpl_gray, match_thresh=0.7):
+    """TM_CCOEFF_NORMED response of tpl_gray over img_gray, refined near coarse hits
+    
+    The template is first matched against img_small (img_gray after one
+    cv2.pyrDown). Full-resolution scores are then computed only in windows
+    around coarse scores >= match_thresh - PYRAMID_MARGIN; every other
+    position is left at -1.
+    """
+    h, w = tpl_gray.shape[:2]
+    res = np.full((img_gray.shape[0] - h + 1, img_gray.shape[1] - w + 1), -1.0, np.float32)
+    
+    tpl_small = cv2.resize(tpl_gray, (w // 2, h // 2), interpolation=cv2.INTER_AREA)
+    coarse = cv2.matchTemplate(img_small, tpl_small, cv2.TM_CCOEFF_NORMED)
+    mask = (coarse >= match_thresh - PYRAMID_MARGIN).astype(np.uint8)
+    if not mask.any():
+        return res
+    
+    # Too many candidates: one full-resolution pass is cheaper than the windows
+    if mask.mean() > 0.25:
+        return cv2.matchTemplate(img_gray, tpl_gray, cv2.TM_CCOEFF_NORMED)
+    
+    # Grow by one coarse pixel so the windows cover +/-2 full-resolution pixels
+    mask = cv2.dilate(mask, np.ones((3, 3), np.uint8))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    
+    for x, y, bw, bh, _ in stats[1:]:
+        x0, y0 = max(2 * x - 1, 0), max(2 * y - 1, 0)
+        x1, y1 = min(2 * (x + bw) + 1, res.shape[1]), min(2 * (y + bh) + 1, res.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            continue
+        window = img_gray[y0:y1 + h - 1, x0:x1 + w - 1]
+        res[y0:y1, x0:x1] = cv2.matchTemplate(window, tpl_gray, cv2.TM_CCOEFF_NORMED)
+    
+    return res
+
 def multi_scale_template_match(image, template, scales=(0.8, 0.9, 1.0, 1.1, 1.2), 
-                               match_thresh=0.7):
+                               match_thresh=0.7, pyramid=False):
     """Multi-scale template matching with NMS"""
     img_gray = preprocess_for_matching(image)
     tpl_gray = preprocess_for_matching(template)
-    
+    return match_preprocessed(img_gray, tpl_gray, scales=scales, match_thresh=match_thresh,
+                              pyramid=pyramid)
+
+def match_preprocessed(img_gray, tpl_gray, scales=(0.8, 0.9, 1.0, 1.1, 1.2),
+                       match_thresh=0.7, pyramid=False):
+    """Multi-scale template matching with NMS on already preprocessed images
+    
+    pyramid=True prunes large templates coarse-to-fine (see
+    coarse_to_fine_match); faster, but a true match with a weak
+    half-resolution score can be missed.
+    """
     hT, wT = tpl_gray.shape[:2]
-    detections = []
+    boxes, scores, box_scales = [], [], []
+    img_small = None
     
     for s in scales:
         new_w = int(wT * s)
@@ -61,100 +143,202 @@ def multi_scale_template_match(image, template, scales=(0.8, 0.9, 1.0, 1.1, 1.2)
         resized = cv2.resize(tpl_gray, (new_w, new_h), interpolation=cv2.INTER_AREA)
         
         try:
-            res = cv2.matchTemplate(img_gray, resized, cv2.TM_CCOEFF_NORMED)
-            loc = np.where(res >= match_thresh)
-            
-            for pt in zip(*loc[::-1]):
-                score = float(res[pt[1], pt[0]])
-                x1, y1 = pt[0], pt[1]
-                x2, y2 = x1 + new_w, y1 + new_h
-                detections.append({
-                    'bbox': [x1, y1, x2, y2],
-                    'score': score,
-                    'scale': s
-                })
+            if pyramid and min(new_w, new_h) >= PYRAMID_MIN_SIZE:
+                if img_small is None:
+                    img_small = cv2.pyrDown(img_gray)
+                res = coarse_to_fine_match(img_gray, img_small, resized, match_thresh)
+            else:
+                res = cv2.matchTemplate(img_gray, resized, cv2.TM_CCOEFF_NORMED)
+            ys, xs = np.nonzero(res >= match_thresh)
+            boxes.append(np.stack([xs, ys, xs + new_w, ys + new_h], axis=1))
+            scores.append(res[ys, xs])
+            box_scales.append(np.full(len(xs), s))
         except Exception as e:
             print(f"  Warning: Scale {s} failed: {e}")
             continue
     
     # Non-maximum suppression
-    if not detections:
+    if not boxes:
         return []
     
-    boxes = np.array([d['bbox'] for d in detections])
-    scores = np.array([d['score'] for d in detections])
+    return non_max_suppression(np.concatenate(boxes), np.concatenate(scores),
+                               np.concatenate(box_scales))
+
+def non_max_suppression(boxes, scores, box_scales, iou_thresh=0.25):
+    """Detections kept by NMS over int boxes [k, 4], scores [k] and scales [k]"""
+    if len(boxes) == 0:
+        return []
     
-    x1 = boxes[:, 0]
-    y1 = boxes[:, 1]
-    x2 = boxes[:, 2]
-    y2 = boxes[:, 3]
+    # OpenCV's native NMS takes x, y, w, h; the +1 keeps inclusive-pixel
+    # areas. Its score threshold must be >= 0 and drops scores at or below
+    # it, so non-positive scores are shifted (order is all that matters).
+    xywh = np.stack([boxes[:, 0], boxes[:, 1],
+                     boxes[:, 2] - boxes[:, 0] + 1, boxes[:, 3] - boxes[:, 1] + 1], axis=1)
+    nms_scores = scores if scores.min() > 0 else scores + np.float32(2.0)
+    keep = np.asarray(cv2.dnn.NMSBoxes(xywh.astype(np.float64), nms_scores, 0.0, iou_thresh)).flatten()
+    
+    return [{
+        'bbox': boxes[i].tolist(),
+        'score': float(scores[i]),
+        'scale': float(box_scales[i])
+    } for i in keep]
+
+def count_symbol_in_pdf(pdf_path, symbol_template_path, dpi=300, match_thresh=0.7,
+                        page_cache=None, workers=1, coarse_dpi=None, pyramid=False):
+    """Count symbol occurrences across all pages"""
+    results = count_symbols_in_pdf(pdf_path, [symbol_template_path], dpi=dpi,
+                                   match_thresh=match_thresh, page_cache=page_cache,
+                                   workers=workers, coarse_dpi=coarse_dpi, pyramid=pyramid)
+    return results[0] if results else None
+
+def count_symbols_in_pdf(pdf_path, symbol_template_paths, dpi=300, match_thresh=0.7,
+                         page_cache=None, workers=1, coarse_dpi=None, pyramid=False):
+    """Count several symbol templates, rasterizing each page only once
     
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
+    Returns one result dict per template, in the order given. Pass a
+    ``PageCache`` to keep the rendered pages around for later calls.
     
-    keep = []
-    while order.size > 0:
-        i = order[0]
-        keep.append(i)
-        
-        if order.size == 1:
-            break
-        
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
-        
-        w = np.maximum(0.0, xx2 - xx1 + 1)
-        h = np.maximum(0.0, yy2 - yy1 + 1)
-        inter = w * h
-        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-6)
-        
-        inds = np.where(iou <= 0.25)[0]  # IoU threshold
-        order = order[inds + 1]
+    Pages are rendered and matched in-process by default. With workers > 1
+    (and no page cache) they go to a process pool instead, one task per
+    page; each worker opens the PDF once and receives the templates once
+    through the pool initializer. Callers using a pool need the usual
+    ``if __name__ == "__main__"`` guard.
     
-    return [detections[i] for i in keep]
-
-def count_symbol_in_pdf(pdf_path, symbol_template_path, dpi=300, match_thresh=0.7):
-    """Count symbol occurrences across all pages"""
-    if not HAS_DEPS:
-        return None
+    coarse_dpi: scan whole pages at this lower DPI and re-render only the
+    candidate clips at dpi to confirm them (see refine_page_matches).
     
-    # Load template
-    template = cv2.imread(str(symbol_template_path))
-    if template is None:
-        print(f"[ERROR] Could not load template: {symbol_template_path}")
+    pyramid: prune large templates coarse-to-fine on full-resolution pages
+    (approximate, see match_preprocessed).
+    """
+    if not HAS_DEPS:
         return None
     
-    print(f"Template size: {template.shape[1]}x{template.shape[0]} pixels")
+    # Load and preprocess templates
+    templates = []
+    for symbol_template_path in symbol_template_paths:
+        template = cv2.imread(str(symbol_template_path), cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            print(f"[ERROR] Could not load template: {symbol_template_path}")
+            return None
+        print(f"Template size: {template.shape[1]}x{template.shape[0]} pixels")
+        templates.append(preprocess_for_matching(template))
     
     # Open PDF
-    doc = fitz.open(pdf_path)
-    total_pages = len(doc)
+    cache = page_cache if page_cache is not None else PageCache(pdf_path)
+    total_pages = len(cache)
     
-    results = {
+    all_results = [{
         'pdf': str(pdf_path),
         'template': str(symbol_template_path),
         'pages': [],
         'total_count': 0
-    }
+    } for symbol_template_path in symbol_template_paths]
     
     print(f"\nProcessing {total_pages} page(s)...")
     
-    for page_num in range(total_pages):
-        print(f"\n[Page {page_num + 1}/{total_pages}]")
-        
-        # Rasterize page
-        page_img = rasterize_pdf_page(pdf_path, page_num, dpi=dpi)
-        print(f"  Page size: {page_img.shape[1]}x{page_img.shape[0]} pixels")
-        
-        # Match template
-        detections = multi_scale_template_match(
-            page_img, template, 
+    if page_cache is None:
+        workers = min(workers or 1, max(total_pages, 1))
+    else:
+        workers = 1
+    
+    try:
+        if workers > 1:
+            tasks = [(page_num, dpi, coarse_dpi, match_thresh, pyramid) for page_num in range(total_pages)]
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=_init_count_worker,
+                                     initargs=(str(pdf_path), templates)) as executor:
+                page_results = executor.map(_count_page_worker, tasks, chunksize=1)
+                for page_num, (page_size, page_detections) in enumerate(page_results):
+                    _add_page_result(all_results, page_num, total_pages, page_size, page_detections)
+        else:
+            for page_num in range(total_pages):
+                # Rasterize page
+                if coarse_dpi:
+                    page_size, page_detections = refine_page_matches(
+                        cache.doc, page_num, cache.get(page_num, dpi=coarse_dpi), templates,
+                        dpi=dpi, coarse_dpi=coarse_dpi, match_thresh=match_thresh
+                    )
+                else:
+                    page_gray = cache.get(page_num, dpi=dpi)
+                    page_size = page_gray.shape
+                    page_detections = match_page(page_gray, templates, match_thresh, pyramid)
+                _add_page_result(all_results, page_num, total_pages, page_size, page_detections)
+                if page_cache is None:
+                    cache.pages.clear()
+    finally:
+        if page_cache is None:
+            cache.close()
+    
+    return all_results
+
+def match_page(page_gray, templates, match_thresh=0.7, pyramid=False):
+    """Match every preprocessed template against one preprocessed page"""
+    return [
+        match_preprocessed(
+            page_gray, tpl_gray,
             scales=(0.8, 0.9, 1.0, 1.1, 1.2),
-            match_thresh=match_thresh
+            match_thresh=match_thresh,
+            pyramid=pyramid
         )
+        for tpl_gray in templates
+    ]
+
+def refine_page_matches(doc, page_num, page_coarse, templates, dpi=300, coarse_dpi=150,
+                        match_thresh=0.7):
+    """Match templates on a coarse render, then confirm each candidate at dpi
+    
+    page_coarse is the page preprocessed at coarse_dpi; the templates are
+    at dpi and are shrunk to match. Coarse candidates are kept down to
+    match_thresh - COARSE_MARGIN, then each one is rendered again at dpi
+    (clip padded by half its size) and matched at its scale. Returns the
+    page size and one detection list per template, both in dpi pixels.
+    """
+    page = doc[page_num]
+    mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
+    page_rect = (page.rect * mat).irect
+    factor = coarse_dpi / dpi
+    to_points = 72.0 / coarse_dpi
+    
+    page_detections = []
+    for tpl_gray in templates:
+        h, w = tpl_gray.shape[:2]
+        tpl_coarse = cv2.resize(tpl_gray, (max(int(w * factor), 1), max(int(h * factor), 1)),
+                                interpolation=cv2.INTER_AREA)
+        candidates = match_preprocessed(page_coarse, tpl_coarse,
+                                        match_thresh=match_thresh - COARSE_MARGIN)
+        
+        boxes, scores, box_scales = [], [], []
+        for cand in candidates:
+            x1, y1, x2, y2 = cand['bbox']
+            pad_x, pad_y = (x2 - x1) / 2, (y2 - y1) / 2
+            clip = fitz.Rect(x1 - pad_x, y1 - pad_y, x2 + pad_x, y2 + pad_y) * to_points & page.rect
+            pix = page.get_pixmap(matrix=mat, clip=clip, alpha=False, colorspace=fitz.csGRAY)
+            crop = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width)
+            crop_gray = preprocess_for_matching(crop)
+            
+            # Crop-relative boxes are shifted by the clip's pixel origin
+            for det in match_preprocessed(crop_gray, tpl_gray, scales=(cand['scale'],),
+                                          match_thresh=match_thresh):
+                bx1, by1, bx2, by2 = det['bbox']
+                boxes.append([bx1 + pix.x, by1 + pix.y, bx2 + pix.x, by2 + pix.y])
+                scores.append(det['score'])
+                box_scales.append(det['scale'])
         
+        # Overlapping clips can confirm the same symbol twice
+        page_detections.append(non_max_suppression(
+            np.array(boxes, dtype=np.int64).reshape(-1, 4),
+            np.array(scores, dtype=np.float32),
+            np.array(box_scales)
+        ))
+    
+    return (page_rect.height, page_rect.width), page_detections
+
+def _add_page_result(all_results, page_num, total_pages, page_size, page_detections):
+    """Append one page's detections to each template's results and report them"""
+    print(f"\n[Page {page_num + 1}/{total_pages}]")
+    print(f"  Page size: {page_size[1]}x{page_size[0]} pixels")
+    
+    for results, detections in zip(all_results, page_detections):
         page_result = {
             'page': page_num + 1,
             'count': len(detections),
@@ -168,14 +352,32 @@ def count_symbol_in_pdf(pdf_path, symbol_template_path, dpi=300, match_thresh=0.
         if detections:
             avg_score = sum(d['score'] for d in detections) / len(detections)
             print(f"  Average confidence: {avg_score:.3f}")
-    
-    doc.close()
-    
-    return results
+
+# Per-process state of a counting worker (set by the pool initializer)
+_WORKER_DOC = None
+_WORKER_TEMPLATES = None
+
+def _init_count_worker(pdf_path, templates):
+    """Process pool initializer: open the PDF once and keep the preprocessed templates"""
+    global _WORKER_DOC, _WORKER_TEMPLATES
+    _WORKER_DOC = fitz.open(pdf_path)
+    _WORKER_TEMPLATES = templates
+
+def _count_page_worker(task):
+    """Worker for count_symbols_in_pdf: rasterize and match one page"""
+    page_num, dpi, coarse_dpi, match_thresh, pyramid = task
+    if coarse_dpi:
+        page_coarse = preprocess_for_matching(
+            rasterize_pdf_page(None, page_num, dpi=coarse_dpi, doc=_WORKER_DOC)
+        )
+        return refine_page_matches(_WORKER_DOC, page_num, page_coarse, _WORKER_TEMPLATES,
+                                   dpi=dpi, coarse_dpi=coarse_dpi, match_thresh=match_thresh)
+    page_gray = preprocess_for_matching(rasterize_pdf_page(None, page_num, dpi=dpi, doc=_WORKER_DOC))
+    return page_gray.shape, match_page(page_gray, _WORKER_TEMPLATES, match_thresh, pyramid)
 
 def main():
     if len(sys.argv) < 3:
-        print("Usage: python count_symbol.py <pdf_path> <symbol_template.png> [--thresh 0.7] [--dpi 300]")
+        print("Usage: python count_symbol.py <pdf_path> <symbol_template.png> [--thresh 0.7] [--dpi 300] [--workers N] [--coarse-dpi 150] [--pyramid]")
         print("\nExample:")
         print("  python count_symbol.py H.pdf outputs/vector_symbols/symbol_866c86c8_count1.png")
         sys.exit(1)
@@ -196,6 +398,20 @@ def main():
         if idx + 1 < len(sys.argv):
             dpi = int(sys.argv[idx + 1])
     
+    workers = 1
+    if "--workers" in sys.argv:
+        idx = sys.argv.index("--workers")
+        if idx + 1 < len(sys.argv):
+            workers = int(sys.argv[idx + 1])
+    
+    coarse_dpi = None
+    if "--coarse-dpi" in sys.argv:
+        idx = sys.argv.index("--coarse-dpi")
+        if idx + 1 < len(sys.argv):
+            coarse_dpi = int(sys.argv[idx + 1])
+    
+    pyramid = "--pyramid" in sys.argv
+    
     if not Path(pdf_path).exists():
         print(f"[ERROR] PDF not found: {pdf_path}")
         sys.exit(1)
@@ -211,8 +427,11 @@ def main():
     print(f"Template: {symbol_path}")
     print(f"Match threshold: {match_thresh}")
     print(f"DPI: {dpi}")
+    if coarse_dpi:
+        print(f"Coarse DPI: {coarse_dpi}")
     
-    results = count_symbol_in_pdf(pdf_path, symbol_path, dpi=dpi, match_thresh=match_thresh)
+    results = count_symbol_in_pdf(pdf_path, symbol_path, dpi=dpi, match_thresh=match_thresh,
+                                  workers=workers, coarse_dpi=coarse_dpi, pyramid=pyramid)
     
     if results is None:
         sys.exit(1)
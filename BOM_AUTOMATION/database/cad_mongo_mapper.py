@@ -25,6 +25,24 @@ except ImportError:
     from pymongo import MongoClient
 
 
+# Structured-field patterns (compiled once)
+_ITEM_RE = re.compile(r'Item\s*(?:no|number)[.:\s]+(\d+)', re.IGNORECASE)
+_MASS_RE = re.compile(r'Mass\s*\(kg\)[.:\s]+(\d+(?:\.\d+)?)', re.IGNORECASE)
+_MATERIAL_RES = (
+    re.compile(r'Material\s*/?[\s:]+([A-Za-z0-9\-+ \.]+?)(?:\n|Scale|Form|Tolerance)', re.IGNORECASE),
+    re.compile(r'EN\s*(\d+:?\d+[A-Za-z\d\-+\.]*)', re.IGNORECASE),
+)
+_SCALE_RE = re.compile(r'Scale\s*[.:\s]+([0-9:.]+)', re.IGNORECASE)
+_TOLERANCE_RE = re.compile(r'Tolerances?\s+(?:acc|according)\s+to\s*[.:\s]+([A-Za-z0-9\s\-\.]+?)(?:\n|All|To)', re.IGNORECASE)
+_DESC_RE = re.compile(r'(?:Description|Proj)[.:\s]+(.+?)(?:\n|Scale|Material)', re.IGNORECASE)
+_DIMENSION_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:mm|Ø|×)')
+_QTY_RE = re.compile(r'(?:QTY|Quantity|Qty)[.:\s]+(\d+)', re.IGNORECASE)
+_FORM_RE = re.compile(r'(?:Form|Standard)\s+(?:acc|according)\s+to\s+([A-Z]+)')
+_DATE_RE = re.compile(r'(\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4})')
+# "Label: value" or "Label = value" lines
+_KEY_VALUE_RE = re.compile(r'[A-Za-z\s]+[.:\s=]+[A-Za-z0-9\s\-\.]')
+
+
 class CADTextExtractor:
     """Extract structured data from CAD PDF text"""
     
@@ -35,9 +53,13 @@ class CADTextExtractor:
     
     def extract_raw_text(self):
         """Extract all text from PDF"""
+        parts = []
         with pdfplumber.open(self.pdf_path) as pdf:
             for page in pdf.pages:
-                self.raw_text += page.extract_text() or ""
+                # Pages without characters (scans) have no text to lay out
+                if page.chars:
+                    parts.append(page.extract_text() or "")
+        self.raw_text += "".join(parts)
         return self.raw_text
     
     def extract_structured_data(self):
@@ -45,59 +67,54 @@ class CADTextExtractor:
         data = {}
         
         # Item Number
-        match = re.search(r'Item\s*(?:no|number)[.:\s]+(\d+)', self.raw_text, re.IGNORECASE)
+        match = _ITEM_RE.search(self.raw_text)
         if match:
             data['item_number'] = int(match.group(1))
         
         # Mass/Weight
-        match = re.search(r'Mass\s*\(kg\)[.:\s]+(\d+(?:\.\d+)?)', self.raw_text, re.IGNORECASE)
+        match = _MASS_RE.search(self.raw_text)
         if match:
             data['mass_kg'] = float(match.group(1))
         
         # Material specifications
         materials = []
-        material_patterns = [
-            r'Material\s*/?[\s:]+([A-Za-z0-9\-+ \.]+?)(?:\n|Scale|Form|Tolerance)',
-            r'EN\s*(\d+:?\d+[A-Za-z\d\-+\.]*)',
-        ]
-        for pattern in material_patterns:
-            matches = re.findall(pattern, self.raw_text, re.IGNORECASE)
-            materials.extend(matches)
+        for pattern in _MATERIAL_RES:
+            materials.extend(pattern.findall(self.raw_text))
         if materials:
             data['materials'] = [m.strip() for m in materials if m.strip()]
         
         # Scale
-        match = re.search(r'Scale\s*[.:\s]+([0-9:.]+)', self.raw_text, re.IGNORECASE)
+        match = _SCALE_RE.search(self.raw_text)
         if match:
             data['scale'] = match.group(1)
         
         # Tolerance standards
-        match = re.search(r'Tolerances?\s+(?:acc|according)\s+to\s*[.:\s]+([A-Za-z0-9\s\-\.]+?)(?:\n|All|To)', self.raw_text, re.IGNORECASE)
+        match = _TOLERANCE_RE.search(self.raw_text)
         if match:
             data['tolerance_standard'] = match.group(1).strip()
         
         # Part description
-        match = re.search(r'(?:Description|Proj)[.:\s]+(.+?)(?:\n|Scale|Material)', self.raw_text, re.IGNORECASE)
+        match = _DESC_RE.search(self.raw_text)
         if match:
             data['description'] = match.group(1).strip()
         
         # Dimensions - extract all numbers with mm
-        dimensions = re.findall(r'(\d+(?:\.\d+)?)\s*(?:mm|Ø|×)', self.raw_text)
+        dimensions = _DIMENSION_RE.findall(self.raw_text)
         if dimensions:
             data['dimensions_mm'] = [float(d) for d in dimensions]
         
         # Quantities
-        quantities = re.findall(r'(?:QTY|Quantity|Qty)[.:\s]+(\d+)', self.raw_text, re.IGNORECASE)
+        quantities = _QTY_RE.findall(self.raw_text)
         if quantities:
             data['quantities'] = [int(q) for q in quantities]
         
         # Forms/Standards
-        forms = re.findall(r'(?:Form|Standard)\s+(?:acc|according)\s+to\s+([A-Z]+)', self.raw_text)
+        forms = _FORM_RE.findall(self.raw_text)
         if forms:
             data['form_standards'] = list(set(forms))
         
         # Created/Revised dates
-        dates = re.findall(r'(\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4})', self.raw_text)
+        dates = _DATE_RE.findall(self.raw_text)
         if dates:
             data['dates_found'] = dates
         
@@ -108,7 +125,7 @@ class CADTextExtractor:
         for line in lines:
             line = line.strip()
             # Match patterns like "Label: value" or "Label = value"
-            if re.search(r'[A-Za-z\s]+[.:\s=]+[A-Za-z0-9\s\-\.]', line) and len(line) > 5:
+            if len(line) > 5 and _KEY_VALUE_RE.search(line):
                 key_value_pairs.append(line)
         
         if key_value_pairs:
@@ -153,7 +170,7 @@ class MongoDBStorage:
     
     def store_extraction(self, data):
         """Store extracted CAD data in MongoDB"""
-        if not self.db:
+        if self.db is None:
             print("[ERROR] Not connected to MongoDB")
             return None
         
@@ -170,15 +187,16 @@ class MongoDBStorage:
             result = collection.insert_one(doc)
             print("[OK] Stored drawing with ID: {}".format(result.inserted_id))
             
-            # Store each extracted field as separate document
+            # Store each extracted field as separate document (one round-trip)
             fields_collection = self.db['fields']
-            for key, value in data['structured_data'].items():
-                fields_collection.insert_one({
-                    'drawing_id': result.inserted_id,
-                    'field_name': key,
-                    'field_value': value,
-                    'data_type': type(value).__name__
-                })
+            field_docs = [{
+                'drawing_id': result.inserted_id,
+                'field_name': key,
+                'field_value': value,
+                'data_type': type(value).__name__
+            } for key, value in data['structured_data'].items()]
+            if field_docs:
+                fields_collection.insert_many(field_docs, ordered=False)
             
             print("[OK] Stored {} fields in MongoDB".format(len(data['structured_data'])))
             return result.inserted_id
@@ -189,7 +207,7 @@ class MongoDBStorage:
     
     def query_by_field(self, field_name, field_value):
         """Query drawings by structured field"""
-        if not self.db:
+        if self.db is None:
             return []
         try:
             collection = self.db['drawings']
@@ -126,7 +126,7 @@ def example_workflow():
         try:
             # Load templates
             template_mgr = SymbolTemplate()
-            symbols = template_mgr.list_symbols()
+            symbols = template_mgr.get_all_symbols()
             
             if not symbols:
                 print("  [WARN] No symbols stored")
@@ -134,11 +134,10 @@ def example_workflow():
             else:
                 print(f"  [*] Loading {len(symbols)} templates...")
                 templates_dict = {}
-                for sym in symbols:
-                    img = template_mgr.get_symbol(sym['symbol_name'])
+                for symbol_name, img in symbols.items():
                     if img is not None:
-                        templates_dict[sym['symbol_name']] = img
-                        print(f"    [OK] {sym['symbol_name']}")
+                        templates_dict[symbol_name] = img
+                        print(f"    [OK] {symbol_name}")
                 
                 template_mgr.close()
                 
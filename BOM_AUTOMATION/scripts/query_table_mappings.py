@@ -111,6 +111,8 @@ class TableMappingQuery:
         for i, doc in enumerate(docs):
             if '_id' in doc:
                 del doc['_id']
+            if 'raw_table_gz' in doc:
+                del doc['raw_table_gz']
             if 'raw_table' in doc:
                 del doc['raw_table']  # Remove raw table to reduce size
             if 'import_date' in doc:
@@ -134,6 +136,8 @@ class TableMappingQuery:
         for i, doc in enumerate(docs):
             if '_id' in doc:
                 del doc['_id']
+            if 'raw_table_gz' in doc:
+                del doc['raw_table_gz']
             if 'raw_table' in doc:
                 del doc['raw_table']
             if 'import_date' in doc:
@@ -0,0 +1,20 @@
+from core import page_pool
+from core.page_pool import page_blocks, pool_workers
+
+
+def test_pool_workers_defaults_to_in_process_for_short_pdfs(monkeypatch):
+    monkeypatch.setattr(page_pool.os, 'cpu_count', lambda: 16)
+    assert pool_workers(8) == 1
+    assert pool_workers(2 * page_pool.MIN_PAGES_PER_WORKER) == 2
+    assert pool_workers(1000) == page_pool.MAX_WORKERS
+    # Explicit counts are only capped at the page count
+    assert pool_workers(8, 4) == 4
+    assert pool_workers(3, 4) == 3
+
+
+def test_page_blocks_are_contiguous_and_cover_every_page():
+    pages = list(range(1, 11))
+    blocks = page_blocks(pages, 2)
+    assert [page for block in blocks for page in block] == pages
+    assert blocks[0] == [1]
+    assert page_blocks(pages, 2, block_size=4) == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
@@ -0,0 +1,48 @@
+import pytest
+
+from core import rule_engine
+from core.rule_engine import RuleEngine
+
+
+def test_normalize_material_direct_and_pattern():
+    engine = RuleEngine()
+    assert engine.normalize_material(" ss304 ")['normalized'] == 'Stainless Steel 304'
+    assert engine.normalize_material("SS304L")['standard'] == 'AISI 304'
+    assert engine.normalize_material("al7075")['normalized'] == 'Aluminum 7075'
+    assert engine.normalize_material("brass")['category'] == 'unknown'
+
+
+def test_normalize_material_token_in_free_text():
+    engine = RuleEngine()
+    assert engine.normalize_material("Plate SS316 3mm")['normalized'] == 'Stainless Steel 316'
+    # Whole tokens only: "MS" inside another word is not mild steel
+    assert engine.normalize_material("ALUMS sheet")['category'] == 'unknown'
+
+
+class _OverlappingKeysEngine(RuleEngine):
+    def _load_material_mappings(self):
+        mappings = super()._load_material_mappings()
+        mappings['SS'] = {'original': 'SS', 'normalized': 'Stainless Steel'}
+        mappings['SS 316'] = {'original': 'SS 316', 'normalized': 'Stainless Steel 316'}
+        return mappings
+
+
+@pytest.mark.parametrize('use_ahocorasick', [True, False])
+def test_find_material_token_prefers_longest_at_same_start(monkeypatch, use_ahocorasick):
+    if use_ahocorasick:
+        pytest.importorskip('ahocorasick')
+    monkeypatch.setattr(rule_engine, 'HAS_AHOCORASICK', use_ahocorasick)
+    engine = _OverlappingKeysEngine()
+    assert engine._find_material_token("PLATE SS 316 3MM") == 'SS 316'
+    assert engine._find_material_token("PLATE SS 3MM") == 'SS'
+
+
+def test_link_symbols_to_text_nearest_within_distance():
+    engine = RuleEngine()
+    symbols = [{'bbox': [0, 0, 10, 10]}, {'bbox': []}, {'bbox': [1000, 1000, 1010, 1010]}]
+    texts = [{'bbox': [100, 0, 110, 10]}, {'bbox': [20, 0, 30, 10]}]
+    relations = engine.link_symbols_to_text(symbols, texts, max_distance=50.0)
+    assert len(relations) == 1
+    assert relations[0]['symbol_index'] == 0
+    assert relations[0]['text_index'] == 1
+    assert abs(relations[0]['distance'] - 20.0) < 1e-9
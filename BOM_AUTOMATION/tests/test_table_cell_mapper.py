@@ -0,0 +1,119 @@
+import pytest
+
+from core.table_cell_mapper import (
+    PdfiumBackend, PdfplumberBackend, TableExtractor, _looks_like_header,
+)
+
+
+def test_extract_header_data_material_stops_at_next_label():
+    extractor = TableExtractor('unused.pdf')
+    table = [
+        ['Item no.: 1', 'Material: X', 'Drawing no.: 4711'],
+        ['Scale: 1:10', None, None],
+    ]
+    header = extractor.extract_header_data(table)
+    assert header['material'] == 'X'
+    assert header['drawing_number'] == '4711'
+    assert header['item_number'] == '1'
+    assert header['scale'] == '1:10'
+
+
+def test_looks_like_header_checks_every_row():
+    rows = [['Pos', 'Part', 'Qty']] + [[str(i), 'Bolt', '4'] for i in range(10)]
+    assert not _looks_like_header(rows)
+    assert _looks_like_header(rows + [['Drawing no.: 4711', None, None]])
+
+
+ROWS = [['Pos', 'Part', 'Qty'], ['1', 'Bolt', '4'], ['2', 'Nut', '8']]
+
+
+def _ruled_table_pdf(path):
+    """One page with a 3x3 ruled table; the outer frame is drawn as a rectangle"""
+    fitz = pytest.importorskip('fitz')
+    doc = fitz.open()
+    page = doc.new_page(width=400, height=300)
+    xs = [50, 150, 250, 350]
+    tops = [50, 80, 110, 140]
+    shape = page.new_shape()
+    shape.draw_rect(fitz.Rect(xs[0], tops[0], xs[-1], tops[-1]))
+    for x in xs[1:-1]:
+        shape.draw_line((x, tops[0]), (x, tops[-1]))
+    for top in tops[1:-1]:
+        shape.draw_line((xs[0], top), (xs[-1], top))
+    shape.finish(width=0.5, color=(0, 0, 0))
+    shape.commit()
+    for row, top in zip(ROWS, tops):
+        for text, x in zip(row, xs):
+            page.insert_text((x + 5, top + 20), text, fontsize=10)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_pdfium_backend_matches_pdfplumber(tmp_path):
+    pytest.importorskip('pdfplumber')
+    pytest.importorskip('pypdfium2')
+    pdf_path = _ruled_table_pdf(tmp_path / 'table.pdf')
+    
+    assert PdfplumberBackend.page_count(pdf_path) == PdfiumBackend.page_count(pdf_path) == 1
+    plumber = PdfplumberBackend.extract_tables(pdf_path, [1])
+    pdfium = PdfiumBackend.extract_tables(pdf_path, [1])
+    assert plumber == [(1, [ROWS])]
+    assert pdfium == plumber
+
+
+def test_merge_segments_snaps_and_joins():
+    segments = [
+        (10.0, 0.0, 50.0),
+        (11.0, 52.0, 100.0),   # within snap and join of the first: one edge
+        (10.5, 200.0, 250.0),  # same line, gap too wide: separate edge
+        (40.0, 0.0, 100.0),
+    ]
+    merged = PdfiumBackend._merge_segments(segments, 3, 3)
+    assert merged == [(10.5, 0.0, 100.0), (10.5, 200.0, 250.0), (40.0, 0.0, 100.0)]
+
+
+def _grid_intersections(xs, tops):
+    """Intersections of a full grid: each row line and each column line is one edge"""
+    return {
+        (x, top): ({row}, {col})
+        for row, top in enumerate(tops)
+        for col, x in enumerate(xs)
+    }
+
+
+def test_intersections_to_cells_and_tables():
+    intersections = _grid_intersections([0, 10, 20], [0, 5, 10])
+    # A lone box elsewhere on the page: one cell, so not a table
+    intersections.update({
+        (100, 0): ({10}, {20}), (110, 0): ({10}, {21}),
+        (100, 5): ({11}, {20}), (110, 5): ({11}, {21}),
+    })
+    cells = PdfiumBackend._intersections_to_cells(intersections)
+    assert sorted(cells) == [
+        (0, 0, 10, 5), (0, 5, 10, 10), (10, 0, 20, 5), (10, 5, 20, 10), (100, 0, 110, 5),
+    ]
+    
+    tables = PdfiumBackend._cells_to_tables(cells)
+    assert len(tables) == 1
+    assert sorted(tables[0]) == [(0, 0, 10, 5), (0, 5, 10, 10), (10, 0, 20, 5), (10, 5, 20, 10)]
+
+
+def test_intersections_to_cells_needs_connecting_edges():
+    # Four corners, but the right column line stops short of the bottom row line
+    intersections = {
+        (0, 0): ({0}, {0}), (10, 0): ({0}, {1}),
+        (0, 5): ({1}, {0}), (10, 5): ({1}, {2}),
+    }
+    assert PdfiumBackend._intersections_to_cells(intersections) == []
+
+
+def test_extract_header_data_value_in_next_row():
+    extractor = TableExtractor('unused.pdf')
+    # The drawing number label ends the first row, its value starts the next
+    table = [
+        ['Item no.: 1', 'Drawing no.:'],
+        ['4711', 'Scale: 1:10'],
+    ]
+    header = extractor.extract_header_data(table)
+    assert header == {'item_number': '1', 'drawing_number': '4711', 'scale': '1:10'}
@@ -0,0 +1,21 @@
+from core.table_extractor import AdvancedTableExtractor
+
+
+def test_deduplicate_tables_keys_geometric_regions_by_bbox():
+    extractor = AdvancedTableExtractor('unused.pdf')
+    grid = [['Pos', 'Part'], ['1', 'Bolt']]
+    extractor.tables = [
+        {'page': 1, 'method': 'pdfplumber_native', 'data': grid},
+        {'page': 1, 'method': 'grid_detection', 'data': grid},
+        {'page': 1, 'method': 'geometric_clustering', 'bbox': (0, 0, 10, 10), 'raw_text': 'a'},
+        {'page': 1, 'method': 'geometric_clustering', 'bbox': (20, 0, 30, 10), 'raw_text': 'b'},
+        {'page': 2, 'method': 'geometric_clustering', 'bbox': (0, 0, 10, 10), 'raw_text': 'a'},
+        {'page': 2, 'method': 'geometric_clustering', 'bbox': (0, 0, 10, 10), 'raw_text': 'a'},
+    ]
+    extractor._deduplicate_tables()
+    assert [table['method'] for table in extractor.tables] == [
+        'pdfplumber_native', 'geometric_clustering', 'geometric_clustering', 'geometric_clustering',
+    ]
+    assert [table.get('bbox') for table in extractor.tables[1:]] == [
+        (0, 0, 10, 10), (20, 0, 30, 10), (0, 0, 10, 10),
+    ]